@@ -1,8 +1,17 @@
 import os
 from celery import Celery
+from celery.signals import task_prerun
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 app = Celery('config')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
+
+
+@task_prerun.connect
+def reset_replica_pinning(**kwargs):
+    # Задача начинает с чтения с реплик; после первой записи читает с default
+    from config.replicas import reset_pinning
+    reset_pinning()
+
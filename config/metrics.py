@@ -0,0 +1,309 @@
+# config/metrics.py
+import hmac
+import itertools
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+
+# Метрики в текстовом формате Prometheus, без prometheus_client.
+# Histogram живёт в памяти процесса (замеры внутри одного процесса). Всё, что отдаёт /metrics,
+# хранится в общем кэше Django: Shared* пишут воркеры Celery, BufferedHistogram — воркеры веб-сервера,
+# поэтому любой воркер за балансировщиком отдаёт одни и те же суммы
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+REGISTRY = []
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # значения меток -> [счётчики корзин..., сумма, количество]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def label_key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def observe(self, value, **labels):
+        key = self.label_key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def observe_many(self, values, **labels):
+        for value in values:
+            self.observe(value, **labels)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {key: list(values) for key, values in self._series.items()}
+
+    def quantile(self, q, **labels):
+        # Оценка по корзинам, как histogram_quantile в Prometheus
+        values = self.snapshot().get(self.label_key(labels))
+        if not values or not values[-1]:
+            return None
+        rank, cumulative, lower = q * values[-1], 0, 0.0
+        for bound, count in zip(self.buckets, values):
+            if count and cumulative + count >= rank:
+                return lower + (bound - lower) * (rank - cumulative) / count
+            cumulative += count
+            lower = bound
+        return self.buckets[-1]
+
+    def collect(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for key, values in sorted(self.snapshot().items()):
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bucket, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(labels + [('le', format_value(bucket))])} {cumulative}")
+            lines.append(f"{self.name}_bucket{format_labels(labels + [('le', '+Inf')])} {values[-1]}")
+            lines.append(f'{self.name}_sum{format_labels(labels)} {format_value(values[-2])}')
+            lines.append(f'{self.name}_count{format_labels(labels)} {values[-1]}')
+        return lines
+
+
+class SharedHistogram(Histogram):
+    """
+    Гистограмма в общем кэше: корзины, сумма и количество — отдельные ключи, которые увеличиваются
+    через cache.incr. Значения меток перечисляются заранее, чтобы /metrics знал все ряды.
+    """
+    SUM_SCALE = 10 ** 6  # cache.incr работает с целыми
+
+    def __init__(self, name, documentation, labelvalues=None, buckets=LATENCY_BUCKETS):
+        self.labelvalues = dict(labelvalues or {})
+        super().__init__(name, documentation, tuple(self.labelvalues), buckets)
+
+    def _keys(self, key):
+        prefix = ':'.join(('metrics', self.name) + key)
+        return [f'{prefix}:{index}' for index in range(len(self.buckets))] + [f'{prefix}:sum', f'{prefix}:count']
+
+    def observe(self, value, **labels):
+        self.observe_many([value], **labels)
+
+    def observe_many(self, values, **labels):
+        # Одна операция с кэшем на задействованную корзину, а не на каждое значение
+        values = list(values)
+        if not values:
+            return
+        keys = self._keys(self.label_key(labels))
+        for index, count in Counter(bisect_left(self.buckets, value) for value in values).items():
+            if index < len(self.buckets):
+                incr(keys[index], count)
+        incr(keys[-2], round(sum(values) * self.SUM_SCALE))
+        incr(keys[-1], len(values))
+
+    def _series_keys(self):
+        return list(itertools.product(*self.labelvalues.values()))
+
+    def clear(self):
+        cache.delete_many([k for key in self._series_keys() for k in self._keys(key)])
+
+    def snapshot(self):
+        series = {}
+        for key in self._series_keys():
+            keys = self._keys(key)
+            stored = cache.get_many(keys)
+            if not stored.get(keys[-1]):
+                continue
+            values = [stored.get(k, 0) for k in keys]
+            values[-2] /= self.SUM_SCALE
+            series[key] = values
+        return series
+
+
+class BufferedHistogram(Histogram):
+    """
+    Гистограмма с заранее неизвестными значениями меток (представление, статус) в общем кэше.
+    Значения копятся в памяти процесса и не реже раза в METRICS_FLUSH_INTERVAL секунд прибавляются
+    к ключам SharedHistogram; перед отдачей /metrics процесс сбрасывает и свой буфер.
+    Список рядов тоже лежит в кэше: процесс дописывает в него свои ряды при каждом сбросе,
+    так что ряд, потерянный при одновременной записи, вернётся следующим сбросом.
+    """
+    SUM_SCALE = SharedHistogram.SUM_SCALE
+    _keys = SharedHistogram._keys
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames, buckets)
+        self._known = set()
+        self._flushed = time.monotonic()
+
+    @property
+    def _series_key(self):
+        return f'metrics:{self.name}:series'
+
+    def observe(self, value, **labels):
+        super().observe(value, **labels)
+        if time.monotonic() - self._flushed >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._series = self._series, {}
+            self._flushed = time.monotonic()
+        if not pending:
+            return
+        self._known.update(pending)
+        stored = cache.get(self._series_key) or []
+        missing = self._known.difference(stored)
+        if missing:
+            cache.set(self._series_key, [*stored, *missing], timeout=None)
+        for key, values in pending.items():
+            keys = self._keys(key)
+            for bucket_key, count in zip(keys, values[:-2]):
+                if count:
+                    incr(bucket_key, count)
+            incr(keys[-2], round(values[-2] * self.SUM_SCALE))
+            incr(keys[-1], values[-1])
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+        known = self._known.union(cache.get(self._series_key) or [])
+        self._known.clear()
+        cache.delete_many([k for key in known for k in self._keys(key)] + [self._series_key])
+
+    def snapshot(self):
+        self.flush()
+        known = cache.get(self._series_key) or []
+        stored = cache.get_many([k for key in known for k in self._keys(key)])
+        series = {}
+        for key in known:
+            keys = self._keys(key)
+            if not stored.get(keys[-1]):
+                continue
+            values = [stored.get(k, 0) for k in keys]
+            values[-2] /= self.SUM_SCALE
+            series[key] = values
+        return series
+
+
+class SharedCounter:
+    def __init__(self, name, documentation, labelvalues=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelvalues = dict(labelvalues or {})
+        REGISTRY.append(self)
+
+    def _key(self, key):
+        return ':'.join(('metrics', self.name) + key)
+
+    def inc(self, amount=1, **labels):
+        if amount:
+            incr(self._key(tuple(str(labels.get(name, '')) for name in self.labelvalues)), amount)
+
+    def clear(self):
+        cache.delete_many([self._key(key) for key in itertools.product(*self.labelvalues.values())])
+
+    def value(self, **labels):
+        return cache.get(self._key(tuple(str(labels.get(name, '')) for name in self.labelvalues)), 0)
+
+    def collect(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        keys = list(itertools.product(*self.labelvalues.values()))
+        stored = cache.get_many([self._key(key) for key in keys])
+        for key in keys:
+            lines.append(f'{self.name}{format_labels(list(zip(self.labelvalues, key)))} '
+                         f'{stored.get(self._key(key), 0)}')
+        return lines
+
+
+class SharedGauge:
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        REGISTRY.append(self)
+
+    def set(self, value):
+        cache.set(f'metrics:{self.name}', value, timeout=None)
+
+    def value(self):
+        return cache.get(f'metrics:{self.name}')
+
+    def collect(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge']
+        value = self.value()
+        if value is not None:
+            lines.append(f'{self.name} {format_value(value)}')
+        return lines
+
+
+def incr(key, delta):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # Ключа ещё нет; add не перезапишет значение, если его успел создать другой воркер
+        if not cache.add(key, delta, timeout=None):
+            cache.incr(key, delta)
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}'
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.collect())
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    # Без METRICS_TOKEN эндпоинт выключен; Prometheus передаёт токен как Authorization: Bearer
+    token = settings.METRICS_TOKEN
+    if not token:
+        raise Http404
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+REQUEST_DURATION = BufferedHistogram(
+    'http_request_duration_seconds', 'Время обработки запроса', ('view', 'method', 'status'))
+REQUEST_DB_QUERIES = BufferedHistogram(
+    'http_request_db_queries', 'Число запросов к базе за запрос', ('view',), COUNT_BUCKETS)
+REQUEST_DB_DURATION = BufferedHistogram(
+    'http_request_db_duration_seconds', 'Время запросов к базе за запрос', ('view',))
+REQUEST_SERIALIZER_DURATION = BufferedHistogram(
+    'http_request_serializer_duration_seconds', 'Время сериализаторов DRF за запрос', ('view',))
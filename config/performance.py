@@ -0,0 +1,137 @@
+# config/performance.py
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .metrics import REQUEST_DB_DURATION, REQUEST_DB_QUERIES, REQUEST_DURATION, REQUEST_SERIALIZER_DURATION
+
+current_timing = ContextVar('current_timing', default=None)
+
+
+class RequestTiming:
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serializer = 0.0
+        self._depth = 0
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - started
+            self.queries += 1
+
+    @contextmanager
+    def measure_serializer(self):
+        # Вложенные сериализаторы уже учтены во внешнем
+        self._depth += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            if not self._depth:
+                self.serializer += time.perf_counter() - started
+
+    def server_timing(self, total):
+        return (f'db;dur={self.db * 1000:.2f};desc="{self.queries} queries", '
+                f'serializer;dur={self.serializer * 1000:.2f}, total;dur={total * 1000:.2f}')
+
+
+class TimedSerializerMixin:
+    """Учитывает время валидации и представления сериализатора в замере текущего запроса."""
+
+    def to_representation(self, instance):
+        timing = current_timing.get()
+        if timing is None:
+            return super().to_representation(instance)
+        with timing.measure_serializer():
+            return super().to_representation(instance)
+
+    def run_validation(self, *args, **kwargs):
+        timing = current_timing.get()
+        if timing is None:
+            return super().run_validation(*args, **kwargs)
+        with timing.measure_serializer():
+            return super().run_validation(*args, **kwargs)
+
+
+class PerformanceMiddleware:
+    """
+    Для доли PERFORMANCE_SAMPLE_RATE запросов считает запросы к базе и их время, время сериализаторов
+    и общее время, пишет их в заголовок Server-Timing и в гистограммы для /metrics.
+    При PERFORMANCE_SAMPLE_RATE = 0 Django исключает middleware из цепочки.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.PERFORMANCE_SAMPLE_RATE
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+        # Под ASGI цепочка остаётся асинхронной и async-представления не уходят в поток
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        timing = RequestTiming()
+        token = current_timing.set(timing)
+        started = time.perf_counter()
+        try:
+            with self.wrap_connections(timing):
+                response = self.get_response(request)
+        finally:
+            current_timing.reset(token)
+        return self.finish(request, response, timing, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        timing = RequestTiming()
+        token = current_timing.set(timing)
+        started = time.perf_counter()
+        # Соединения с базой — свои у каждого потока, а асинхронный ORM работает в потоке
+        # sync_to_async, общем для всего запроса: обёртки ставятся и снимаются там же
+        stack = await sync_to_async(self.wrap_connections)(timing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            current_timing.reset(token)
+        return self.finish(request, response, timing, time.perf_counter() - started)
+
+    def sampled(self):
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def wrap_connections(self, timing):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timing.db_wrapper))
+        return stack
+
+    def finish(self, request, response, timing, total):
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        REQUEST_DURATION.observe(total, view=view, method=request.method, status=response.status_code)
+        REQUEST_DB_QUERIES.observe(timing.queries, view=view)
+        REQUEST_DB_DURATION.observe(timing.db, view=view)
+        REQUEST_SERIALIZER_DURATION.observe(timing.serializer, view=view)
+        response['Server-Timing'] = timing.server_timing(total)
+        return response
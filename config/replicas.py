@@ -0,0 +1,122 @@
+# config/replicas.py
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Чтения уходят на реплики из DATABASE_REPLICA_URLS, записи — на default.
+# После записи текущий запрос или задача читает только с default, а клиент
+# ещё REPLICA_PIN_SECONDS — по cookie, пока реплика догоняет
+
+PIN_COOKIE = 'db_pinned'
+
+
+class _State:
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+_state = ContextVar('replica_state', default=None)
+
+
+def _current():
+    state = _state.get()
+    if state is None:
+        state = _State()
+        _state.set(state)
+    return state
+
+
+def reset_pinning(pinned=False):
+    """Начало запроса или задачи Celery: решение о чтении с default принимается заново."""
+    return _state.set(_State(pinned))
+
+
+def is_pinned():
+    state = _state.get()
+    return state is not None and state.pinned
+
+
+def pin_to_primary():
+    _current().pinned = True
+
+
+@contextmanager
+def use_primary():
+    state = _current()
+    previous, state.pinned = state.pinned, True
+    try:
+        yield
+    finally:
+        state.pinned = previous
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or is_pinned() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        # select_for_update и get_or_create тоже приходят сюда — после них читаем с default
+        state = _current()
+        state.pinned = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На репликах те же данные, что на default
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaPinningMiddleware:
+    """
+    Небезопасные методы и запросы с cookie db_pinned читают с default.
+    Если запрос что-то записал, ставит cookie на REPLICA_PIN_SECONDS: следующие чтения
+    этого клиента не увидят отставания реплики.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = reset_pinning(self.should_pin(request))
+        try:
+            response = self.get_response(request)
+            return self.finish(response)
+        finally:
+            _state.reset(token)
+
+    async def __acall__(self, request):
+        token = reset_pinning(self.should_pin(request))
+        try:
+            response = await self.get_response(request)
+            return self.finish(response)
+        finally:
+            _state.reset(token)
+
+    def should_pin(self, request):
+        return request.method not in ('GET', 'HEAD', 'OPTIONS') or PIN_COOKIE in request.COOKIES
+
+    def finish(self, response):
+        if _state.get().wrote:
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True,
+                                samesite='Lax')
+        return response
@@ -0,0 +1,142 @@
+# config/schema.py
+import hashlib
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.urls import URLResolver, get_resolver
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_safe
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.generators import OpenAPISchemaGenerator
+
+logger = logging.getLogger(__name__)
+
+# Схема OpenAPI собирается один раз (python manage.py generate_schema при сборке или деплое)
+# и отдаётся из памяти процесса с ETag по содержимому. Если файлов нет, схема собирается
+# при первом запросе. При OPENAPI_SCHEMA_AUTO_REFRESH (по умолчанию DEBUG) файлы пересобираются,
+# когда меняются модули URL-конфигурации
+
+API_INFO = openapi.Info(
+    title="API документация",
+    default_version='v1',
+    description="Документация для API",
+    terms_of_service="https://www.google.com/policies/terms/",
+    contact=openapi.Contact(email="your_email@example.com"),
+    license=openapi.License(name="BSD License"),
+)
+
+SCHEMA_FORMATS = {
+    '.json': (OpenAPICodecJson, 'application/json'),
+    '.yaml': (OpenAPICodecYaml, 'application/yaml'),
+}
+FINGERPRINT_FILE = 'urlconf.fingerprint'
+
+_loaded = {}  # формат -> (содержимое, ETag)
+_loaded_fingerprint = None
+_lock = threading.Lock()
+
+
+def schema_path(fmt):
+    return os.path.join(settings.OPENAPI_SCHEMA_DIR, f'openapi{fmt}')
+
+
+def urlconf_fingerprint():
+    """Хеш путей и времени изменения всех модулей URL-конфигурации, подключённых через include()."""
+    modules, resolvers = set(), [get_resolver()]
+    while resolvers:
+        resolver = resolvers.pop()
+        module = resolver.urlconf_module
+        if hasattr(module, '__file__'):
+            modules.add(module.__file__)
+        resolvers.extend(p for p in resolver.url_patterns if isinstance(p, URLResolver))
+    parts = []
+    for path in sorted(modules):
+        try:
+            parts.append(f'{path}:{os.stat(path).st_mtime_ns}')
+        except OSError:
+            parts.append(path)
+    return hashlib.sha256('\n'.join(parts).encode()).hexdigest()
+
+
+def render_schema():
+    """Схема во всех форматах: {'.json': bytes, '.yaml': bytes}. Публичная, без привязки к запросу и хосту."""
+    schema = OpenAPISchemaGenerator(API_INFO).get_schema(request=None, public=True)
+    return {fmt: codec(validators=[]).encode(schema) for fmt, (codec, _) in SCHEMA_FORMATS.items()}
+
+
+def write_schema(rendered=None, fingerprint=None):
+    rendered = rendered or render_schema()
+    os.makedirs(settings.OPENAPI_SCHEMA_DIR, exist_ok=True)
+    for fmt, content in rendered.items():
+        with open(schema_path(fmt), 'wb') as f:
+            f.write(content)
+    with open(os.path.join(settings.OPENAPI_SCHEMA_DIR, FINGERPRINT_FILE), 'w') as f:
+        f.write(fingerprint or urlconf_fingerprint())
+    return [schema_path(fmt) for fmt in rendered]
+
+
+def _read_files(fingerprint=None):
+    # Файлы подходят, если есть все форматы и (в режиме разработки) совпадает отпечаток URL-конфигурации
+    try:
+        if fingerprint is not None:
+            with open(os.path.join(settings.OPENAPI_SCHEMA_DIR, FINGERPRINT_FILE)) as f:
+                if f.read().strip() != fingerprint:
+                    return None
+        rendered = {}
+        for fmt in SCHEMA_FORMATS:
+            with open(schema_path(fmt), 'rb') as f:
+                rendered[fmt] = f.read()
+        return rendered
+    except OSError:
+        return None
+
+
+def _load(fingerprint):
+    global _loaded_fingerprint
+    rendered = _read_files(fingerprint)
+    if rendered is None:
+        if fingerprint is None:
+            logger.warning('Нет файлов схемы в %s, собираем при запросе; запустите generate_schema',
+                           settings.OPENAPI_SCHEMA_DIR)
+        rendered = render_schema()
+        try:
+            write_schema(rendered, fingerprint)
+        except OSError as exc:
+            logger.warning('Не удалось сохранить схему: %s', exc)
+    _loaded.clear()
+    _loaded.update({fmt: (content, '"%s"' % hashlib.sha256(content).hexdigest()[:32])
+                    for fmt, content in rendered.items()})
+    _loaded_fingerprint = fingerprint
+
+
+def get_schema(fmt):
+    """(содержимое, ETag) схемы в формате '.json' или '.yaml'."""
+    fingerprint = urlconf_fingerprint() if settings.OPENAPI_SCHEMA_AUTO_REFRESH else None
+    if not _loaded or fingerprint != _loaded_fingerprint:
+        with _lock:
+            if not _loaded or fingerprint != _loaded_fingerprint:
+                _load(fingerprint)
+    return _loaded[fmt]
+
+
+def clear_loaded_schema():
+    global _loaded_fingerprint
+    with _lock:
+        _loaded.clear()
+        _loaded_fingerprint = None
+
+
+@require_safe
+def schema_file_view(request, format):
+    content, etag = get_schema(format)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content, content_type=SCHEMA_FORMATS[format][1])
+    response['ETag'] = etag
+    # Клиент хранит схему, но сверяет ETag при каждом открытии документации
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
@@ -31,6 +31,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'config.performance.PerformanceMiddleware',
+    'config.replicas.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -47,6 +49,20 @@ ROOT_URLCONF = 'config.urls'
 CORS_ALLOW_ALL_ORIGINS = True
 
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+# Адрес Bot API (для замеров можно указать локальный fake_telegram)
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+TELEGRAM_TIMEOUT = float(os.getenv('TELEGRAM_TIMEOUT', '10'))
+TELEGRAM_MAX_CONCURRENCY = int(os.getenv('TELEGRAM_MAX_CONCURRENCY', '20'))
+# Лимиты Telegram: ~30 сообщений в секунду на бота и 1 в секунду на чат.
+# Лимит бота общий: каждый процесс-отправитель получает TELEGRAM_RATE_LIMIT / TELEGRAM_SENDER_PROCESSES
+TELEGRAM_RATE_LIMIT = float(os.getenv('TELEGRAM_RATE_LIMIT', '30'))
+TELEGRAM_PER_CHAT_RATE_LIMIT = float(os.getenv('TELEGRAM_PER_CHAT_RATE_LIMIT', '1'))
+# Максимальная длина сводки; длиннее — делится на несколько сообщений (лимит Telegram 4096)
+TELEGRAM_MAX_MESSAGE_LENGTH = int(os.getenv('TELEGRAM_MAX_MESSAGE_LENGTH', '4096'))
+# Вебхук для кнопок напоминаний: Telegram присылает секрет в X-Telegram-Bot-Api-Secret-Token;
+# без секрета вебхук выключен
+TELEGRAM_WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET', '')
+TELEGRAM_SNOOZE_MINUTES = int(os.getenv('TELEGRAM_SNOOZE_MINUTES', '15'))
 
 TEMPLATES = [
     {
@@ -71,6 +87,27 @@ DATABASES = {
     'default': dj_database_url.config(default=os.getenv('DATABASE_URL'))
 }
 
+# Реплики только для чтения через запятую, например
+# postgres://ro@replica1/habits,postgres://ro@replica2/habits; локально — sqlite:///replica.sqlite3
+DATABASE_REPLICAS = []
+for index, url in enumerate(filter(None, os.getenv('DATABASE_REPLICA_URLS', '').split(',')), 1):
+    DATABASES[f'replica{index}'] = {**dj_database_url.parse(url.strip()), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica{index}')
+DATABASE_ROUTERS = ['config.replicas.PrimaryReplicaRouter']
+# Сколько секунд после записи клиент читает с default (запас на отставание реплик)
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '5'))
+
+# Общий кэш (circuit breaker и т.п.); без CACHE_URL — локальный кэш процесса
+CACHE_URL = os.getenv('CACHE_URL')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL,
+    } if CACHE_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -100,29 +137,127 @@ STATIC_URL = 'static/'
 
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# Схема OpenAPI: файлы из generate_schema; при автообновлении пересобираются после изменения urls.py
+OPENAPI_SCHEMA_DIR = os.getenv('OPENAPI_SCHEMA_DIR', str(BASE_DIR / 'openapi'))
+OPENAPI_SCHEMA_AUTO_REFRESH = os.getenv('OPENAPI_SCHEMA_AUTO_REFRESH', str(DEBUG)) == 'True'
+SWAGGER_SETTINGS = {'SPEC_URL': ('schema-json', {'format': '.json'})}
+REDOC_SETTINGS = {'SPEC_URL': ('schema-json', {'format': '.json'})}
+
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 5,
+    # Ставки config.throttling.SlidingWindowThrottle: "<throttle_scope>.ip" для анонимов, ".user" — по пользователю
+    'DEFAULT_THROTTLE_RATES': {
+        'public_habits.ip': os.getenv('THROTTLE_PUBLIC_HABITS_IP', '120/min'),
+        'public_habits.user': os.getenv('THROTTLE_PUBLIC_HABITS_USER', '600/min'),
+        'register.ip': os.getenv('THROTTLE_REGISTER_IP', '10/hour'),
+    },
+    # Число доверенных прокси перед приложением: IP клиента берётся из X-Forwarded-For с их учётом.
+    # 0 — только REMOTE_ADDR, заголовок, присланный клиентом, не учитывается
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '0')),
 }
+# Счётчики ограничений в Redis (по умолчанию CACHE_URL; без него — в кэше Django).
+# Таймаут ограничивает задержку запроса, если Redis тормозит: тогда запрос пропускается
+THROTTLE_REDIS_URL = os.getenv('THROTTLE_REDIS_URL', CACHE_URL)
+THROTTLE_REDIS_TIMEOUT = float(os.getenv('THROTTLE_REDIS_TIMEOUT', '0.05'))
 
 AUTH_USER_MODEL = 'users.CustomUser'
 
+# Кэш пользователя для JWT-аутентификации: общий (секунды) и в памяти процесса
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv('AUTH_USER_CACHE_TIMEOUT', '300'))
+AUTH_USER_LOCAL_TTL = float(os.getenv('AUTH_USER_LOCAL_TTL', '5'))
+
 CELERY_BROKER_URL = 'redis://localhost:6379'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379'
 CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
+# Процессов в одном воркере Celery (по умолчанию, как у Celery, — число CPU)
+CELERY_WORKER_CONCURRENCY = int(os.getenv('CELERY_WORKER_CONCURRENCY', str(os.cpu_count() or 1)))
+# Сколько процессов всех воркеров отправляют в Telegram одновременно: пачки chord расходятся
+# по ним параллельно. При нескольких воркерах укажите сумму их concurrency
+TELEGRAM_SENDER_PROCESSES = int(os.getenv('TELEGRAM_SENDER_PROCESSES', str(CELERY_WORKER_CONCURRENCY)))
+
+# Размер пачки привычек на одну подзадачу рассылки
+REMINDER_CHUNK_SIZE = int(os.getenv('REMINDER_CHUNK_SIZE', '500'))
+# Не больше стольких привычек за один запуск (догоняние после простоя идёт порциями)
+REMINDER_MAX_PER_TICK = int(os.getenv('REMINDER_MAX_PER_TICK', '10000'))
+# Блокировка координатора на случай, если рассылка так и не завершилась (секунды)
+REMINDER_LOCK_TIMEOUT = int(os.getenv('REMINDER_LOCK_TIMEOUT', '300'))
+
+# Кэш публичного списка привычек: срок хранения страниц и max-age для CDN/браузеров (секунды)
+PUBLIC_HABITS_CACHE_TIMEOUT = int(os.getenv('PUBLIC_HABITS_CACHE_TIMEOUT', '300'))
+PUBLIC_HABITS_MAX_AGE = int(os.getenv('PUBLIC_HABITS_MAX_AGE', '60'))
+
+# Максимум привычек в одном запросе к /api/habits/habits/bulk/
+HABITS_BULK_MAX_ITEMS = int(os.getenv('HABITS_BULK_MAX_ITEMS', '500'))
+
+# Доля запросов с замером времени (Server-Timing, /metrics); 0 — middleware отключено
+PERFORMANCE_SAMPLE_RATE = float(os.getenv('PERFORMANCE_SAMPLE_RATE', '1.0'))
+# Как часто воркер веб-сервера переносит свои замеры запросов в общий кэш (секунды)
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+# Токен для /metrics (Authorization: Bearer <токен>); без него эндпоинт выключен
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Размер порции строк при потоковой выгрузке привычек
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '2000'))
+
+# Импорт привычек: строк в одной пачке bulk_create и сколько ошибок по строкам возвращать
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '1000'))
+IMPORT_MAX_ERRORS = int(os.getenv('IMPORT_MAX_ERRORS', '100'))
+
+# Повторные попытки доставки напоминаний
+REMINDER_MAX_ATTEMPTS = int(os.getenv('REMINDER_MAX_ATTEMPTS', '5'))
+REMINDER_RETRY_BASE_DELAY = float(os.getenv('REMINDER_RETRY_BASE_DELAY', '30'))  # секунды
+REMINDER_RETRY_MAX_DELAY = float(os.getenv('REMINDER_RETRY_MAX_DELAY', '3600'))
+REMINDER_RETRY_BATCH_SIZE = int(os.getenv('REMINDER_RETRY_BATCH_SIZE', '500'))
+# Предел длительности задач рассылки (soft_time_limit), меньше интервала beat;
+# столько же длится аренда строки журнала доставки, взятой в работу
+REMINDER_TASK_TIME_LIMIT = int(os.getenv('REMINDER_TASK_TIME_LIMIT', '55'))
+
+# Circuit breaker для Telegram: доля ошибок, минимум запросов и окно (сек), пауза (сек)
+TELEGRAM_BREAKER_THRESHOLD = float(os.getenv('TELEGRAM_BREAKER_THRESHOLD', '0.5'))
+TELEGRAM_BREAKER_MIN_REQUESTS = int(os.getenv('TELEGRAM_BREAKER_MIN_REQUESTS', '20'))
+TELEGRAM_BREAKER_WINDOW = int(os.getenv('TELEGRAM_BREAKER_WINDOW', '60'))
+TELEGRAM_BREAKER_COOLDOWN = int(os.getenv('TELEGRAM_BREAKER_COOLDOWN', '120'))
+
+# Outbox уведомлений о новых привычках
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '100'))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '5'))
+# Аренда взятой пачки (сек): дольше отправки пачки, после падения воркера строки вернутся в работу
+OUTBOX_LEASE = int(os.getenv('OUTBOX_LEASE', '120'))
+
+# Очередь нажатий кнопок из вебхука (список Redis; без URL — очередь процесса).
+# Задача разбора ставится через TELEGRAM_UPDATES_BATCH_DELAY секунд после первого нажатия всплеска
+TELEGRAM_UPDATES_QUEUE_URL = os.getenv('TELEGRAM_UPDATES_QUEUE_URL', CACHE_URL)
+TELEGRAM_UPDATES_BATCH_SIZE = int(os.getenv('TELEGRAM_UPDATES_BATCH_SIZE', '500'))
+TELEGRAM_UPDATES_BATCH_DELAY = float(os.getenv('TELEGRAM_UPDATES_BATCH_DELAY', '1'))
+TELEGRAM_UPDATES_SCHEDULE_TIMEOUT = 60  # если задача потерялась, очередь разберёт beat
 
 CELERY_BEAT_SCHEDULE = {
     'send-habit-reminders': {
         'task': 'habits.tasks.send_habit_reminders',
         'schedule': crontab(minute='*'),  # Выполнять каждую минуту
     },
+    'retry-reminder-deliveries': {
+        'task': 'habits.tasks.retry_reminder_deliveries',
+        'schedule': crontab(minute='*'),
+    },
+    # Страховка: добирает outbox, если постановка в очередь после коммита не удалась
+    'drain-notification-outbox': {
+        'task': 'habits.tasks.drain_notification_outbox',
+        'schedule': crontab(minute='*'),
+    },
+    # Страховка для очереди нажатий кнопок, если задачу из вебхука не удалось поставить
+    'apply-telegram-updates': {
+        'task': 'habits.tasks.apply_telegram_updates',
+        'schedule': crontab(minute='*'),
+    },
 }
@@ -0,0 +1,147 @@
+# config/throttling.py
+import logging
+import math
+import threading
+import time
+
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+logger = logging.getLogger(__name__)
+
+# Скользящее окно по двум соседним фиксированным окнам: оценка = предыдущее * доля
+# его перекрытия со скользящим окном + текущее. На запрос — один вызов Lua-скрипта в Redis
+# (THROTTLE_REDIS_URL, по умолчанию CACHE_URL); без Redis — счётчики в кэше Django.
+# Отказ Redis запросы не блокирует
+
+SLIDING_WINDOW_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+if previous * tonumber(ARGV[2]) / 1000000 + current >= tonumber(ARGV[1]) then
+    return {0, current, previous}
+end
+current = redis.call('INCR', KEYS[1])
+if current == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+end
+return {1, current, previous}
+"""
+
+_blocked = {}  # ключ -> monotonic-время, до которого клиенту отказываем без обращения к Redis
+LOCAL_MAX_BLOCKED = 10_000
+_blocked_lock = threading.Lock()
+
+
+def clear_local_blocks():
+    with _blocked_lock:
+        _blocked.clear()
+
+
+class RedisWindows:
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url, socket_timeout=settings.THROTTLE_REDIS_TIMEOUT,
+                                           socket_connect_timeout=settings.THROTTLE_REDIS_TIMEOUT)
+        self.script = self.client.register_script(SLIDING_WINDOW_SCRIPT)
+
+    def hit(self, current_key, previous_key, limit, weight, ttl):
+        allowed, current, previous = self.script(
+            keys=[current_key, previous_key], args=[limit, int(weight * 1_000_000), ttl])
+        return bool(allowed), int(current), int(previous)
+
+
+class CacheWindows:
+    # Проверка и инкремент не атомарны вместе: при гонке лимит может быть превышен на число параллельных запросов
+    def hit(self, current_key, previous_key, limit, weight, ttl):
+        stored = cache.get_many([current_key, previous_key])
+        current, previous = stored.get(current_key, 0), stored.get(previous_key, 0)
+        if previous * weight + current >= limit:
+            return False, current, previous
+        if cache.add(current_key, 1, ttl):
+            return True, 1, previous
+        try:
+            return True, cache.incr(current_key), previous
+        except ValueError:  # ключ истёк между add и incr
+            cache.add(current_key, 1, ttl)
+            return True, 1, previous
+
+
+_windows = None
+
+
+def reset_windows():
+    # Хранилище выбирается заново по текущему THROTTLE_REDIS_URL
+    global _windows
+    _windows = None
+
+
+def get_windows():
+    global _windows
+    if _windows is None:
+        url = settings.THROTTLE_REDIS_URL
+        _windows = RedisWindows(url) if url else CacheWindows()
+    return _windows
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """
+    Ограничение по throttle_scope представления: аутентифицированные пользователи — по id
+    со ставкой "<scope>.user", остальные — по IP со ставкой "<scope>.ip"
+    (REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']). Без ставки для scope запрос не проверяется.
+    """
+
+    def __init__(self):
+        # Ставка зависит от представления и пользователя, выбирается в allow_request
+        pass
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        user = getattr(request, 'user', None)
+        kind = 'user' if user is not None and user.is_authenticated else 'ip'
+        self.rate = api_settings.DEFAULT_THROTTLE_RATES.get(f'{scope}.{kind}') if scope else None
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        ident = user.pk if kind == 'user' else self.get_ident(request)
+        key = f'throttle:{scope}:{kind}:{ident}'
+
+        # Быстрый путь: клиент, которому уже отказали, до конца ожидания не доходит до Redis
+        blocked_until = _blocked.get(key)
+        if blocked_until is not None:
+            left = blocked_until - time.monotonic()
+            if left > 0:
+                self.wait_seconds = left
+                return False
+            _blocked.pop(key, None)
+
+        now = time.time()
+        window = int(now // self.duration)
+        elapsed = now / self.duration - window  # доля текущего окна, которая уже прошла
+        try:
+            allowed, current, previous = get_windows().hit(
+                f'{key}:{window}', f'{key}:{window - 1}', self.num_requests, 1 - elapsed, self.duration * 2)
+        except (redis.RedisError, OSError) as exc:
+            logger.warning('Ограничение запросов недоступно, запрос пропущен: %s', exc)
+            return True
+        if allowed:
+            return True
+
+        self.wait_seconds = self.compute_wait(current, previous, elapsed)
+        with _blocked_lock:
+            if len(_blocked) >= LOCAL_MAX_BLOCKED:
+                _blocked.clear()
+            _blocked[key] = time.monotonic() + self.wait_seconds
+        return False
+
+    def compute_wait(self, current, previous, elapsed):
+        # Когда оценка опустится ниже лимита: вес предыдущего окна падает линейно,
+        # а если лимит исчерпан текущим окном — не раньше его конца
+        if current >= self.num_requests or not previous:
+            return (1 - elapsed) * self.duration
+        needed = 1 - (self.num_requests - current) / previous
+        return max(needed - elapsed, 0) * self.duration
+
+    def wait(self):
+        return max(math.ceil(self.wait_seconds), 1)
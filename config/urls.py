@@ -3,18 +3,13 @@ from django.http import HttpResponse
 from django.urls import path, re_path, include
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 
-# Swagger Schema View
+from .metrics import metrics_view
+from .schema import API_INFO, schema_file_view
+
+# Swagger Schema View: страницы /swagger/ и /redoc/ загружают готовую схему с /swagger.json (SPEC_URL)
 schema_view = get_schema_view(
-    openapi.Info(
-        title="API документация",
-        default_version='v1',
-        description="Документация для API",
-        terms_of_service="https://www.google.com/policies/terms/",
-        contact=openapi.Contact(email="your_email@example.com"),
-        license=openapi.License(name="BSD License"),
-    ),
+    API_INFO,
     public=True,
     permission_classes=(permissions.AllowAny,),
 )
@@ -30,9 +25,9 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/habits/',include ( 'habits.urls' ) ),  # Префикс для приложения habits
     path('api/users/',include ( 'users.urls' ) ),  # Префикс для приложения users
+    path('metrics', metrics_view, name='metrics'),  # Prometheus, по METRICS_TOKEN
     path('', home, name='home'),  # Главная страница
-    re_path(r'^swagger(?P<format>\.json|\.yaml)$',
-            schema_view.without_ui(cache_timeout=0), name='schema-json'),
+    re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_file_view, name='schema-json'),
     path('swagger/', schema_view.with_ui('swagger',
          cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc',
@@ -1,6 +1,7 @@
 # habits/admin.py
 from django.contrib import admin
-from .models import Habit
+from .models import Habit, HabitCompletion, HabitStats, Notification, ReminderDelivery
+from .search import search_habits
 
 
 @admin.register(Habit)
@@ -9,3 +10,35 @@ class HabitAdmin(admin.ModelAdmin):
                     'is_pleasant', 'is_public')
     list_filter = ('is_pleasant', 'is_public', 'user')
     search_fields = ('action', 'place')
+
+    def get_search_results(self, request, queryset, search_term):
+        # Индексный поиск вместо icontains по каждому полю (см. habits.search)
+        return search_habits(queryset, search_term), False
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ('chat_id', 'habit', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    raw_id_fields = ('habit',)
+
+
+@admin.register(ReminderDelivery)
+class ReminderDeliveryAdmin(admin.ModelAdmin):
+    list_display = ('habit', 'slot', 'status', 'attempts', 'latency', 'sent_at', 'next_attempt_at')
+    list_filter = ('status',)
+    raw_id_fields = ('habit',)
+
+
+@admin.register(HabitCompletion)
+class HabitCompletionAdmin(admin.ModelAdmin):
+    list_display = ('habit', 'date', 'source', 'created_at')
+    list_filter = ('source',)
+    raw_id_fields = ('habit',)
+
+
+@admin.register(HabitStats)
+class HabitStatsAdmin(admin.ModelAdmin):
+    list_display = ('habit', 'completions', 'current_streak', 'longest_streak', 'last_completed_on')
+    raw_id_fields = ('habit',)
+
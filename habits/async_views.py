@@ -0,0 +1,152 @@
+# habits/async_views.py
+import functools
+from contextlib import nullcontext
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponseNotModified, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework import exceptions
+from rest_framework.request import Request
+
+from config.replicas import use_primary
+from config.throttling import SlidingWindowThrottle
+from users.authentication import CachedJWTAuthentication
+from .cache import PUBLIC_HABITS_VERSION_KEY, changed_within, get_version, make_etag, user_habits_version_key
+from .models import Habit
+from .pagination import AsyncPageNumberPagination, KeysetPagination
+from .search import search_habits
+from .serializers import HabitSerializer, PublicHabitSerializer
+from .views import PublicHabitViewSet, StandardResultsSetPagination
+
+# Асинхронные варианты чтения HabitViewSet и PublicHabitViewSet для запуска под ASGI.
+# DRF не умеет async-представления, поэтому это обычные async-функции Django
+# с теми же сериализаторами, пагинацией и форматом ответов
+
+
+class AsyncStandardResultsSetPagination(AsyncPageNumberPagination, StandardResultsSetPagination):
+    pass
+
+
+def async_api_view(view):
+    # Только GET; исключения DRF превращаются в ответы, как это делает APIView
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        drf_request = Request(request)
+        try:
+            if request.method != 'GET':
+                raise exceptions.MethodNotAllowed(request.method)
+            return await view(drf_request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            response = JsonResponse({'detail': exc.detail}, status=exc.status_code,
+                                    json_dumps_params={'ensure_ascii': False})
+            if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                response['WWW-Authenticate'] = CachedJWTAuthentication().authenticate_header(drf_request)
+            if isinstance(exc, exceptions.Throttled) and exc.wait is not None:
+                response['Retry-After'] = str(int(exc.wait))
+            return response
+    return wrapper
+
+
+async def authenticate(request):
+    # JWT проверяется в потоке: кэш пользователя и, при промахе, база — синхронные
+    result = await sync_to_async(CachedJWTAuthentication().authenticate)(request)
+    if result is None:
+        raise exceptions.NotAuthenticated()
+    return result[0]
+
+
+async def check_throttle(request, view):
+    # Те же ставки, что у DRF-представления `view`; клиент Redis синхронный
+    throttle = SlidingWindowThrottle()
+    if not await sync_to_async(throttle.allow_request)(request, view):
+        raise exceptions.Throttled(throttle.wait())
+
+
+async def paginate(request, queryset, paginator_class):
+    paginator = KeysetPagination() if 'cursor' in request.query_params else paginator_class()
+    page = await paginator.apaginate_queryset(queryset, request)
+    return paginator, page
+
+
+def json_response(data, **kwargs):
+    return JsonResponse(data, json_dumps_params={'ensure_ascii': False}, **kwargs)
+
+
+async def conditional_get(request, user, handler):
+    # Тот же ETag и Last-Modified по версии привычек пользователя, что у HabitViewSet
+    version = await sync_to_async(get_version)(user_habits_version_key(user.id))
+    etag = make_etag(version, user.id, request.get_full_path(), 'json')
+    last_modified = version // 1_000_000
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = await handler()
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@async_api_view
+async def habit_list(request):
+    user = await authenticate(request)
+
+    async def handler():
+        queryset = Habit.objects.filter(user=user)
+        paginator, page = await paginate(request, queryset, AsyncPageNumberPagination)
+        return json_response(paginator.get_paginated_data(HabitSerializer(page, many=True).data))
+    return await conditional_get(request, user, handler)
+
+
+@async_api_view
+async def habit_detail(request, pk):
+    user = await authenticate(request)
+
+    async def handler():
+        try:
+            habit = await Habit.objects.aget(pk=pk, user=user)
+        except Habit.DoesNotExist:
+            raise exceptions.NotFound()
+        return json_response(HabitSerializer(habit).data)
+    return await conditional_get(request, user, handler)
+
+
+@async_api_view
+async def public_habit_list(request):
+    # Тот же кэш страниц и ETag, что у PublicHabitViewSet.list
+    await check_throttle(request, PublicHabitViewSet)
+    version = await sync_to_async(get_version)(PUBLIC_HABITS_VERSION_KEY)
+    params = request.query_params
+    etag = make_etag(version, request.get_host(), request.path, params.get('page', '1'),
+                     params.get('page_size', ''), params.get('cursor'), params.get('search', ''))
+
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        key = f'habits:public:list:{etag}'
+        data = await cache.aget(key)
+        if data is None:
+            with use_primary() if changed_within(version, settings.REPLICA_PIN_SECONDS) else nullcontext():
+                # Проверка наличия FTS5 в SQLite — синхронный запрос
+                queryset = await sync_to_async(search_habits)(Habit.objects.filter(is_public=True),
+                                                              params.get('search', ''))
+                paginator, page = await paginate(request, queryset, AsyncStandardResultsSetPagination)
+            data = paginator.get_paginated_data(PublicHabitSerializer(page, many=True).data)
+            await cache.aset(key, data, settings.PUBLIC_HABITS_CACHE_TIMEOUT)
+        response = json_response(data)
+
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=settings.PUBLIC_HABITS_MAX_AGE)
+    return response
+
+
+@async_api_view
+async def public_habit_detail(request, pk):
+    await check_throttle(request, PublicHabitViewSet)
+    try:
+        habit = await Habit.objects.aget(pk=pk, is_public=True)
+    except Habit.DoesNotExist:
+        raise exceptions.NotFound()
+    return json_response(PublicHabitSerializer(habit).data)
@@ -0,0 +1,274 @@
+# habits/benchmarks.py
+import asyncio
+import math
+import statistics
+import time
+from collections import Counter
+from datetime import time as dt_time
+
+import httpx
+from celery import current_app
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from config.throttling import SlidingWindowThrottle, clear_local_blocks, reset_windows
+from .fake_telegram import FakeTelegramServer
+from .metrics import SCHEDULE_LAG, TELEGRAM_LATENCY
+from .models import Habit
+from .scheduling import compute_next_reminder
+from .tasks import send_habit_reminders
+
+# Бюджеты: максимум запросов к базе и медиана времени ответа, мс.
+# Запросы — жёсткая граница (регрессия N+1), время зависит от машины
+DEFAULT_BUDGETS = {
+    'habit-list': {'queries': 3, 'p50_ms': 50},
+    'habit-list-cursor': {'queries': 2, 'p50_ms': 50},
+    'habit-retrieve': {'queries': 2, 'p50_ms': 30},
+    'habit-create': {'queries': 5, 'p50_ms': 50},
+    'habit-update': {'queries': 3, 'p50_ms': 50},
+    'habit-partial-update': {'queries': 3, 'p50_ms': 50},
+    'habit-destroy': {'queries': 8, 'p50_ms': 50},
+    'public-list': {'queries': 2, 'p50_ms': 50},
+    'public-list-cached': {'queries': 0, 'p50_ms': 20},
+    'public-retrieve': {'queries': 1, 'p50_ms': 30},
+    'register': {'queries': 3, 'p50_ms': 1000},
+    'send-habit-reminders': {'queries': 20, 'p50_ms': 5000},  # на пачку REMINDER_CHUNK_SIZE
+}
+
+
+class ApiBenchmark:
+    """
+    Засевает users × habits, прогоняет действия HabitViewSet, PublicHabitViewSet, RegisterView
+    и задачу send_habit_reminders (против локальной заглушки Telegram), замеряя время и число запросов.
+    Работает с текущей базой — команда bench_api запускает его на тестовой.
+    """
+
+    def __init__(self, users=10, habits=20, iterations=20, budgets=None):
+        self.users = users
+        self.habits = habits
+        self.iterations = iterations
+        self.budgets = {name: dict(budget) for name, budget in {**DEFAULT_BUDGETS, **(budgets or {})}.items()}
+        self.results = []
+
+    def seed(self):
+        User = get_user_model()
+        users = User.objects.bulk_create([
+            User(username=f'bench{i}', telegram_chat_id=str(100000 + i)) for i in range(self.users)
+        ])
+        habits = []
+        for user in users:
+            for i in range(self.habits):
+                habit = Habit(user=user, place='Дом', time=dt_time(6 + i % 16, 5 + i % 50), action=f'Привычка {i}',
+                              duration=60, reward='Кофе', is_public=i % 2 == 0)
+                habit.next_reminder_at = compute_next_reminder(habit)
+                habits.append(habit)
+        Habit.objects.bulk_create(habits, batch_size=1000)
+        return users[0]
+
+    def measure(self, name, request, prepare=None):
+        latencies, queries, status_code = [], [], None
+        for _ in range(self.iterations):
+            args = prepare() if prepare else ()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                status_code = request(*args)
+                latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured))
+        self._record(name, status_code, max(queries), latencies)
+
+    def _record(self, name, status_code, queries, latencies):
+        latencies = sorted(latencies)
+        budget = self.budgets.get(name, {})
+        p50 = statistics.median(latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        violations = []
+        if 'queries' in budget and queries > budget['queries']:
+            violations.append(f"запросов {queries} > {budget['queries']}")
+        if 'p50_ms' in budget and p50 > budget['p50_ms']:
+            violations.append(f"p50 {p50:.1f} мс > {budget['p50_ms']} мс")
+        self.results.append({
+            'name': name, 'status': status_code, 'queries': queries,
+            'p50_ms': round(p50, 2), 'p95_ms': round(p95, 2),
+            'budget': budget, 'violations': violations,
+        })
+
+    def run_api(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        habit = Habit.objects.filter(user=user).first()
+        public = Habit.objects.filter(is_public=True).first()
+        payload = {'place': 'Дом', 'time': '08:10:00', 'action': 'Зарядка', 'duration': 60, 'reward': 'Кофе'}
+
+        self.measure('habit-list', get(client, '/api/habits/habits/'))
+        next_url = client.get('/api/habits/habits/?cursor=').data['next'] or '/api/habits/habits/?cursor='
+        self.measure('habit-list-cursor', get(client, next_url))
+        self.measure('habit-retrieve', get(client, f'/api/habits/habits/{habit.id}/'))
+        self.measure('habit-create', lambda: client.post('/api/habits/habits/', payload, format='json').status_code)
+        self.measure('habit-update', lambda: client.put(
+            f'/api/habits/habits/{habit.id}/', {**payload, 'duration': 90}, format='json').status_code)
+        self.measure('habit-partial-update', lambda: client.patch(
+            f'/api/habits/habits/{habit.id}/', {'place': 'Парк', 'reward': 'Кофе'}, format='json').status_code)
+
+        def new_habit():
+            return (Habit.objects.create(user=user, **{**payload, 'time': dt_time(8, 10)}),)
+        self.measure('habit-destroy', lambda h: client.delete(f'/api/habits/habits/{h.id}/').status_code,
+                     prepare=new_habit)
+
+        anonymous = APIClient()
+        self.measure('public-list', lambda: anonymous.get('/api/habits/public-habits/').status_code,
+                     prepare=lambda: cache.clear() or ())
+        self.measure('public-list-cached', get(anonymous, '/api/habits/public-habits/'))
+        self.measure('public-retrieve', get(anonymous, f'/api/habits/public-habits/{public.id}/'))
+
+        # Каждая регистрация — с нового IP, чтобы замер не упёрся в ограничение register.ip
+        def register(number):
+            return anonymous.post('/api/users/register/', {
+                'username': f'newbench{number}', 'password': 'S3cure-pass!', 'email': 'bench@example.com',
+            }, format='json', REMOTE_ADDR=f'10.{number >> 16 & 255}.{number >> 8 & 255}.{number & 255}').status_code
+        counter = iter(range(10 ** 6))
+        self.measure('register', lambda: register(next(counter)))
+
+    def run_reminders(self):
+        # Все привычки становятся наступившими; рассылка идёт в заглушку Telegram без лимитов скорости
+        current_app.conf.task_always_eager = True
+        try:
+            with FakeTelegramServer() as server, override_settings(
+                    TELEGRAM_API_URL=server.url, TELEGRAM_BOT_TOKEN='bench',
+                    TELEGRAM_RATE_LIMIT=10 ** 6, TELEGRAM_PER_CHAT_RATE_LIMIT=10 ** 6):
+                Habit.objects.update(next_reminder_at=timezone.now())
+                cache.clear()
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    chunks = send_habit_reminders()
+                    elapsed = (time.perf_counter() - started) * 1000
+        finally:
+            current_app.conf.task_always_eager = False
+        # Запросов на пачку: общее число растёт с объёмом, на пачку — нет
+        self._record('send-habit-reminders', None, math.ceil(len(captured) / max(chunks, 1)), [elapsed])
+        # Те же метрики, что отдаёт /metrics
+        self.results[-1].update(
+            chunks=chunks, messages=len(server.requests),
+            telegram_p50_ms=_ms(TELEGRAM_LATENCY.quantile(0.5, source='reminders')),
+            telegram_p95_ms=_ms(TELEGRAM_LATENCY.quantile(0.95, source='reminders')),
+            schedule_lag_p95_s=SCHEDULE_LAG.quantile(0.95),
+        )
+
+    def run(self):
+        user = self.seed()
+        self.run_api(user)
+        self.run_reminders()
+        return self.report()
+
+    def report(self):
+        return {
+            'users': self.users,
+            'habits_per_user': self.habits,
+            'iterations': self.iterations,
+            'results': self.results,
+            'passed': not any(result['violations'] for result in self.results),
+        }
+
+
+async def load_test(url, requests=1000, concurrency=100, headers=None, timeout=30.0):
+    """
+    Нагрузка на уже запущенный сервер: `concurrency` одновременных клиентов делают `requests` GET-запросов.
+    Для сравнения WSGI и ASGI вызывается на оба развёртывания с одинаковыми параметрами.
+    """
+    latencies, statuses = [], Counter()
+    remaining = iter(range(requests))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async def worker(client):
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                response = await client.get(url)
+                statuses[response.status_code] += 1
+            except httpx.HTTPError as exc:
+                statuses[type(exc).__name__] += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    async with httpx.AsyncClient(headers=headers, timeout=timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'url': url,
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': sum(count for status, count in statuses.items() if not isinstance(status, int) or status >= 400),
+        'statuses': {str(status): count for status, count in statuses.items()},
+        'elapsed': round(elapsed, 3),
+        'rps': round(requests / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(_percentile(latencies, 0.5), 2),
+        'p95_ms': round(_percentile(latencies, 0.95), 2),
+        'p99_ms': round(_percentile(latencies, 0.99), 2),
+    }
+
+
+class _BenchScope:
+    throttle_scope = 'bench'
+
+
+def throttle_overhead(requests=10000, clients=100, redis_url=None):
+    """
+    Время SlidingWindowThrottle.allow_request на запрос, мкс: без ставки для scope,
+    пропущенные запросы (обращение к хранилищу) и отказы (локальный быстрый путь).
+    Хранилище — Redis по `redis_url` или кэш Django.
+    """
+    factory = APIRequestFactory()
+    requests_by_ip = [Request(factory.get('/', REMOTE_ADDR=f'10.0.{i >> 8 & 255}.{i & 255}')) for i in range(clients)]
+    cases = {
+        'no-rate': {},
+        'allowed': {'bench.ip': f'{10 ** 9}/min'},
+        'blocked': {'bench.ip': '1/hour'},
+    }
+    rest_framework = dict(settings.REST_FRAMEWORK)
+    results = {}
+    with override_settings(THROTTLE_REDIS_URL=redis_url or None):
+        reset_windows()
+        try:
+            for name, rates in cases.items():
+                with override_settings(REST_FRAMEWORK={**rest_framework, 'DEFAULT_THROTTLE_RATES': rates}):
+                    cache.clear()
+                    clear_local_blocks()
+                    latencies = []
+                    for number in range(requests):
+                        request = requests_by_ip[number % clients]
+                        started = time.perf_counter()
+                        SlidingWindowThrottle().allow_request(request, _BenchScope)
+                        latencies.append((time.perf_counter() - started) * 1_000_000)
+                latencies.sort()
+                results[name] = {
+                    'p50_us': round(_percentile(latencies, 0.5), 1),
+                    'p95_us': round(_percentile(latencies, 0.95), 1),
+                    'p99_us': round(_percentile(latencies, 0.99), 1),
+                    'max_us': round(latencies[-1], 1),
+                }
+        finally:
+            reset_windows()
+            clear_local_blocks()
+    return {'backend': 'redis' if redis_url else 'cache', 'requests': requests, 'clients': clients,
+            'results': results}
+
+
+def _percentile(values, q):
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+def get(client, url):
+    return lambda: client.get(url).status_code
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
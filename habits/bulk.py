@@ -0,0 +1,147 @@
+# habits/bulk.py
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import PUBLIC_HABITS_VERSION_KEY, bump_version, user_habits_version_key
+from .models import Habit, Notification
+from .scheduling import compute_next_reminder
+from .serializers import HabitBulkSerializer
+from .tasks import enqueue_outbox_drain
+from .telegram_bot import reminder_text
+
+
+def _related_habits(items):
+    # Все related_habit пачки одним запросом
+    ids = set()
+    for item in items:
+        try:
+            ids.add(int(item['related_habit']))
+        except (KeyError, TypeError, ValueError):
+            pass
+    return Habit.objects.in_bulk(ids) if ids else {}
+
+
+def _model_errors(habit):
+    # Правила habits.validators поверх уже загруженных объектов
+    try:
+        habit.clean()
+    except ValidationError as exc:
+        return {'non_field_errors': exc.messages}
+    return None
+
+
+def _invalidate(user, habits):
+    # bulk_create и bulk_update не шлют сигналов
+    bump_version(user_habits_version_key(user.id))
+    if any(habit.is_public or getattr(habit, '_loaded_values', {}).get('is_public') for habit in habits):
+        bump_version(PUBLIC_HABITS_VERSION_KEY)
+
+
+def bulk_create_habits(user, items):
+    """
+    Создаёт пачку привычек в одной транзакции. Возвращает (habits, errors):
+    при любой ошибке в пачке ничего не сохраняется, errors — список {'index', 'errors'}.
+    """
+    context = {'related_habits': _related_habits(items)}
+    habits, errors = [], []
+    for index, item in enumerate(items):
+        serializer = HabitBulkSerializer(data=item, context=context)
+        if not serializer.is_valid():
+            errors.append({'index': index, 'errors': serializer.errors})
+            continue
+        habit = Habit(user=user, **serializer.validated_data)
+        model_errors = _model_errors(habit)
+        if model_errors:
+            errors.append({'index': index, 'errors': model_errors})
+            continue
+        habit.next_reminder_at = compute_next_reminder(habit)
+        habits.append(habit)
+    if errors:
+        return [], errors
+
+    with transaction.atomic():
+        Habit.objects.bulk_create(habits)
+        if user.telegram_chat_id:
+            # Уведомления о новых привычках — через тот же outbox, что и при одиночном создании
+            Notification.objects.bulk_create([
+                Notification(habit=habit, chat_id=user.telegram_chat_id, text=reminder_text(habit.action))
+                for habit in habits
+            ])
+            transaction.on_commit(enqueue_outbox_drain)
+    _invalidate(user, habits)
+    return habits, []
+
+
+def bulk_update_habits(user, items):
+    """Частично обновляет пачку привычек пользователя; каждый элемент содержит id."""
+    ids, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            ids.append(int(item['id']))
+        except (KeyError, TypeError, ValueError):
+            errors.append({'index': index, 'errors': {'id': ['Обязательное поле.']}})
+    existing = Habit.objects.select_related('related_habit').filter(user=user).in_bulk(ids)
+    related_habits = _related_habits(items)
+    # Уже сохранённые связи: частичное изменение без related_habit проверяет и их
+    related_habits.update({habit.related_habit_id: habit.related_habit
+                           for habit in existing.values() if habit.related_habit_id})
+    context = {'related_habits': related_habits}
+
+    habits, fields = [], {'next_reminder_at', 'updated_at'}
+    now = timezone.now()
+    for index, item in enumerate(items):
+        habit = existing.get(_int_or_none(item.get('id')))
+        if habit is None:
+            if 'id' in item:
+                errors.append({'index': index, 'errors': {'id': ['Привычка не найдена.']}})
+            continue
+        # Изменения накладываются на сохранённые значения и проверяются как полная привычка
+        data = {**HabitBulkSerializer(habit).data, **item}
+        serializer = HabitBulkSerializer(habit, data=data, context=context)
+        if not serializer.is_valid():
+            errors.append({'index': index, 'errors': serializer.errors})
+            continue
+        for attr, value in serializer.validated_data.items():
+            if attr in item:
+                setattr(habit, attr, value)
+                fields.add(attr)
+        model_errors = _model_errors(habit)
+        if model_errors:
+            errors.append({'index': index, 'errors': model_errors})
+            continue
+        if habit._schedule_changed():
+            habit.next_reminder_at = compute_next_reminder(habit)
+            habit.regular_reminder_at = None
+            fields.add('regular_reminder_at')
+        habit.updated_at = now
+        habits.append(habit)
+    if errors:
+        return [], errors
+
+    with transaction.atomic():
+        Habit.objects.bulk_update(habits, sorted(fields))
+    _invalidate(user, habits)
+    return habits, []
+
+
+def bulk_delete_habits(user, ids):
+    """Удаляет привычки пользователя по списку id; неизвестные id — ошибки по индексу."""
+    wanted = [_int_or_none(pk) for pk in ids]
+    habits = Habit.objects.filter(user=user, id__in=[pk for pk in wanted if pk is not None])
+    found = set(habits.values_list('id', flat=True))
+    errors = [{'index': index, 'errors': {'id': ['Привычка не найдена.']}}
+              for index, pk in enumerate(wanted) if pk not in found]
+    if errors:
+        return 0, errors
+    with transaction.atomic():
+        # Сигналы post_delete сбрасывают кэш публичного списка
+        deleted = habits.delete()[1].get(Habit._meta.label, 0)
+    return deleted, []
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
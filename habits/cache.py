@@ -0,0 +1,42 @@
+# habits/cache.py
+import hashlib
+import time
+
+from django.core.cache import cache
+
+PUBLIC_HABITS_VERSION_KEY = 'habits:public:version'
+
+# Поля, которые видит публичный список; изменение остальных кэш не сбрасывает
+PUBLIC_FIELDS = {'place', 'time', 'action', 'duration', 'is_public'}
+# Поля, которые не видны в HabitSerializer: их запись (планировщик) не меняет версию списка пользователя
+PRIVATE_FIELDS = {'next_reminder_at', 'regular_reminder_at'}
+
+
+def user_habits_version_key(user_id):
+    # Версия привычек одного пользователя: ETag и Last-Modified для HabitViewSet
+    return f'habits:user:{user_id}:version'
+
+
+def get_version(key):
+    """
+    Версия набора данных (микросекунды последнего изменения).
+    Если ключ вытеснен из кэша, заводится новая версия — старые записи просто перестают читаться.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1_000_000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    cache.set(key, int(time.time() * 1_000_000), None)
+
+
+def changed_within(version, seconds):
+    # Версия — время изменения: пока реплики могли не догнать, данные читаются с primary
+    return time.time() * 1_000_000 - version < seconds * 1_000_000
+
+
+def make_etag(*parts):
+    return '"%s"' % hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
@@ -0,0 +1,114 @@
+# habits/delivery.py
+import asyncio
+import time
+from dataclasses import dataclass, field
+
+import httpx
+from django.conf import settings
+
+
+@dataclass
+class Message:
+    chat_id: str
+    text: str
+    habit_ids: list = field(default_factory=list)  # привычки, о которых это сообщение
+    reply_markup: dict = None  # inline-кнопки
+
+
+@dataclass
+class DeliveryResult:
+    message: Message
+    ok: bool
+    status_code: int = None
+    error: str = ''
+    retry_after: int = None  # секунды, если Telegram ответил 429
+    latency: float = 0.0  # секунды
+
+
+class TokenBucket:
+    """Token bucket для asyncio: `rate` токенов в секунду, не больше `capacity` в запасе."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class TelegramDelivery:
+    """
+    Пакетная отправка сообщений через Bot API.
+
+    Все сообщения пачки идут через один httpx.AsyncClient с пулом keep-alive соединений.
+    Одновременных запросов не больше `concurrency`, общий поток ограничен `rate` сообщений
+    в секунду и `per_chat_rate` на один чат (лимиты Telegram).
+    Лимиты действуют в пределах одного процесса. Пачки рассылки идут параллельно в нескольких
+    процессах, поэтому по умолчанию `rate` — доля лимита бота: TELEGRAM_RATE_LIMIT / TELEGRAM_SENDER_PROCESSES.
+    Лимит на чат делить не нужно: привычки одного пользователя попадают в одну пачку (chunk_by_user).
+    """
+
+    def __init__(self, token=None, base_url=None, concurrency=None, rate=None, per_chat_rate=None,
+                 timeout=None):
+        self.token = token or settings.TELEGRAM_BOT_TOKEN
+        self.base_url = base_url or settings.TELEGRAM_API_URL
+        self.concurrency = concurrency or settings.TELEGRAM_MAX_CONCURRENCY
+        self.rate = rate or settings.TELEGRAM_RATE_LIMIT / max(settings.TELEGRAM_SENDER_PROCESSES, 1)
+        self.per_chat_rate = per_chat_rate or settings.TELEGRAM_PER_CHAT_RATE_LIMIT
+        self.timeout = timeout or settings.TELEGRAM_TIMEOUT
+
+    async def send_many(self, messages):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        bucket = TokenBucket(self.rate)
+        chat_buckets = {}
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+
+        async with httpx.AsyncClient(base_url=self.base_url, limits=limits, timeout=self.timeout) as client:
+            async def send(message):
+                chat_bucket = chat_buckets.setdefault(
+                    message.chat_id, TokenBucket(self.per_chat_rate, capacity=1))
+                await chat_bucket.acquire()
+                async with semaphore:
+                    await bucket.acquire()
+                    return await self._post(client, message)
+
+            return await asyncio.gather(*(send(message) for message in messages))
+
+    async def _post(self, client, message):
+        payload = {'chat_id': message.chat_id, 'text': message.text}
+        if message.reply_markup:
+            payload['reply_markup'] = message.reply_markup
+        started = time.perf_counter()
+        try:
+            response = await client.post(f'/bot{self.token}/sendMessage', json=payload)
+        except httpx.HTTPError as exc:
+            return DeliveryResult(message, ok=False, error=str(exc) or exc.__class__.__name__,
+                                  latency=time.perf_counter() - started)
+
+        latency = time.perf_counter() - started
+        if response.status_code == 200:
+            return DeliveryResult(message, ok=True, status_code=200, latency=latency)
+
+        retry_after = None
+        try:
+            retry_after = response.json().get('parameters', {}).get('retry_after')
+        except ValueError:
+            pass
+        return DeliveryResult(message, ok=False, status_code=response.status_code, error=response.text[:500],
+                              retry_after=retry_after, latency=latency)
+
+
+def send_many(messages, **options):
+    """Синхронная обёртка для Celery-задач и представлений: список DeliveryResult в порядке messages."""
+    if not messages:
+        return []
+    return asyncio.run(TelegramDelivery(**options).send_many(messages))
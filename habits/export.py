@@ -0,0 +1,59 @@
+# habits/export.py
+import csv
+import json
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+# Колонки выгрузки: имя в файле -> поле модели
+HABIT_EXPORT_COLUMNS = {
+    'id': 'id',
+    'place': 'place',
+    'time': 'time',
+    'action': 'action',
+    'is_pleasant': 'is_pleasant',
+    'related_habit': 'related_habit_id',
+    'frequency': 'frequency',
+    'reward': 'reward',
+    'duration': 'duration',
+    'is_public': 'is_public',
+}
+PUBLIC_EXPORT_COLUMNS = {name: HABIT_EXPORT_COLUMNS[name] for name in ('id', 'place', 'time', 'action', 'duration')}
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+class _Echo:
+    # csv.writer пишет строку и сразу отдаёт её генератору, без буфера на весь файл
+    def write(self, value):
+        return value
+
+
+def _rows(queryset, columns):
+    # values_list + iterator: без моделей и сериализатора, на PostgreSQL — серверный курсор
+    rows = queryset.order_by('time', 'id').values_list(*columns.values())
+    return rows.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+
+def _ndjson(queryset, columns):
+    names = list(columns)
+    for row in _rows(queryset, columns):
+        yield json.dumps(dict(zip(names, row)), ensure_ascii=False, default=str) + '\n'
+
+
+def _csv(queryset, columns):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(list(columns))
+    for row in _rows(queryset, columns):
+        yield writer.writerow(row)
+
+
+def export_response(queryset, columns, export_format, filename):
+    """Потоковая выгрузка queryset в NDJSON или CSV с постоянным расходом памяти."""
+    stream = _csv if export_format == 'csv' else _ndjson
+    response = StreamingHttpResponse(stream(queryset, columns), content_type=EXPORT_FORMATS[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
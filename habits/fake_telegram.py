@@ -0,0 +1,93 @@
+# habits/fake_telegram.py
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Server(ThreadingHTTPServer):
+    # По умолчанию очередь 5: при параллельной отправке часть соединений отбрасывается
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class FakeTelegramServer:
+    """
+    Локальная заглушка Bot API для тестов и замеров без доступа к api.telegram.org.
+    Отвечает на POST /bot<token>/<method> как Telegram, с задержкой `latency`
+    и долей ошибок `fail_rate` (ответ `fail_status`).
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, fail_rate=0.0, fail_status=500):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, как у настоящего API
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length)
+                method = self.path.rsplit('/', 1)[-1]
+                try:
+                    payload = json.loads(body or b'{}')
+                except ValueError:
+                    payload = {}
+                status, data = server.handle(method, payload)
+                raw = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def handle(self, method, payload):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.requests.append((method, payload))
+            message_id = len(self.requests)
+        if self.fail_rate and random.random() < self.fail_rate:
+            data = {'ok': False, 'error_code': self.fail_status, 'description': 'Fake failure'}
+            if self.fail_status == 429:
+                data['parameters'] = {'retry_after': 1}
+            return self.fail_status, data
+        return 200, {'ok': True, 'result': {'message_id': message_id, 'chat': {'id': payload.get('chat_id')},
+                                            'text': payload.get('text')}}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,195 @@
+# habits/importer.py
+import csv
+import io
+import json
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .cache import PUBLIC_HABITS_VERSION_KEY, bump_version, user_habits_version_key
+from .models import Habit
+from .scheduling import compute_next_reminder
+from .serializers import HabitBulkSerializer
+
+IMPORT_FORMATS = ('ndjson', 'csv')
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    failed: int = 0
+    errors: list = field(default_factory=list)  # первые IMPORT_MAX_ERRORS ошибок {'line', 'errors'}
+    elapsed: float = 0.0  # секунды
+
+    @property
+    def rows_per_second(self):
+        return (self.created + self.failed) / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'errors': self.errors,
+            'elapsed': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+
+def detect_format(filename, explicit=None):
+    if explicit:
+        return explicit if explicit in IMPORT_FORMATS else None
+    return 'csv' if str(filename).lower().endswith('.csv') else 'ndjson'
+
+
+def read_rows(stream, import_format):
+    """Построчно читает бинарный поток, отдаёт (номер строки, dict) или (номер строки, текст ошибки)."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if import_format == 'csv' else None)
+    if import_format == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, {key: value for key, value in row.items() if key is not None}
+        return
+    for line_number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, 'Строка не является JSON.'
+            continue
+        yield line_number, row if isinstance(row, dict) else 'Ожидается JSON-объект.'
+
+
+class HabitImporter:
+    """
+    Потоковый импорт привычек пользователя: строки проверяются сериализатором и правилами
+    habits.validators и пишутся пачками bulk_create, в памяти — только текущая пачка и карта ref -> id.
+
+    Кроме полей привычки строка может содержать `ref` — свой идентификатор в файле — и `related_ref`,
+    ссылку на приятную привычку из того же файла. Строка со ссылкой вперёд ждёт, пока цель не сохранится;
+    `related_habit` по-прежнему ссылается на уже существующую привычку по id.
+    Уведомления в Telegram о созданных привычках при импорте не отправляются.
+    """
+
+    def __init__(self, user, batch_size=None, max_errors=None):
+        self.user = user
+        self.batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+        self.max_errors = settings.IMPORT_MAX_ERRORS if max_errors is None else max_errors
+        self.result = ImportResult()
+        self.refs = {}  # ref -> id сохранённой привычки
+        self.seen_refs = set()
+        self.failed_refs = set()
+        self.waiting = defaultdict(list)  # ref цели -> строки, которые на неё ссылаются
+        self.batch = []
+        self.has_public = False
+
+    def run(self, rows):
+        started = time.perf_counter()
+        for line, row in rows:
+            if isinstance(row, str):
+                self.fail(line, {'non_field_errors': [row]})
+            else:
+                self.add(line, row)
+            if len(self.batch) >= self.batch_size:
+                self.flush()
+        while self.batch:
+            self.flush()
+        while self.waiting:
+            ref, waiting = self.waiting.popitem()
+            for line, row_ref, _ in waiting:
+                self.fail(line, {'related_ref': [f'Строка с ref={ref} не найдена.']}, row_ref)
+        if self.result.created:
+            bump_version(user_habits_version_key(self.user.id))
+        if self.has_public:
+            bump_version(PUBLIC_HABITS_VERSION_KEY)
+        self.result.elapsed = time.perf_counter() - started
+        return self.result
+
+    def add(self, line, row):
+        # Пустые ячейки CSV — как отсутствующие поля, чтобы сработали значения по умолчанию
+        item = {key: value for key, value in row.items() if value not in ('', None)}
+        item.pop('id', None)
+        ref = _ref(item.pop('ref', None))
+        related_ref = _ref(item.pop('related_ref', None))
+        if ref is not None:
+            if ref in self.seen_refs:
+                return self.fail(line, {'ref': [f'Повторяющийся ref={ref}.']})
+            self.seen_refs.add(ref)
+        if related_ref is None:
+            self.batch.append((line, ref, item))
+        elif related_ref in self.failed_refs:
+            self.fail(line, {'related_ref': [f'Строка с ref={related_ref} не импортирована.']}, ref)
+        elif related_ref in self.refs:
+            self.batch.append((line, ref, {**item, 'related_habit': self.refs[related_ref]}))
+        else:
+            self.waiting[related_ref].append((line, ref, item))
+
+    def flush(self):
+        batch, self.batch = self.batch, []
+        # Все related_habit пачки одним запросом, в том числе только что импортированные
+        ids = _int_ids(item['related_habit'] for _, _, item in batch if 'related_habit' in item)
+        context = {'related_habits': Habit.objects.in_bulk(ids) if ids else {}}
+
+        habits, refs = [], []
+        for line, ref, item in batch:
+            serializer = HabitBulkSerializer(data=item, context=context)
+            if not serializer.is_valid():
+                self.fail(line, serializer.errors, ref)
+                continue
+            habit = Habit(user=self.user, **serializer.validated_data)
+            try:
+                habit.clean()
+            except ValidationError as exc:
+                self.fail(line, {'non_field_errors': exc.messages}, ref)
+                continue
+            habit.next_reminder_at = compute_next_reminder(habit)
+            habits.append(habit)
+            refs.append(ref)
+
+        if habits:
+            with transaction.atomic():
+                Habit.objects.bulk_create(habits)
+        self.result.created += len(habits)
+        self.has_public = self.has_public or any(habit.is_public for habit in habits)
+
+        # Дождавшиеся своей цели строки уходят в следующую пачку
+        for habit, ref in zip(habits, refs):
+            if ref is None:
+                continue
+            self.refs[ref] = habit.id
+            for line, row_ref, item in self.waiting.pop(ref, ()):
+                self.batch.append((line, row_ref, {**item, 'related_habit': habit.id}))
+
+    def fail(self, line, errors, ref=None):
+        self.result.failed += 1
+        if len(self.result.errors) < self.max_errors:
+            self.result.errors.append({'line': line, 'errors': errors})
+        if ref is None:
+            return
+        # Строки, ссылающиеся на неимпортированную, тоже не импортируются
+        self.failed_refs.add(ref)
+        for waiting_line, waiting_ref, _ in self.waiting.pop(ref, ()):
+            self.fail(waiting_line, {'related_ref': [f'Строка с ref={ref} не импортирована.']}, waiting_ref)
+
+
+def import_habits(user, stream, import_format, batch_size=None):
+    """Импортирует привычки из бинарного потока CSV или NDJSON, возвращает ImportResult."""
+    return HabitImporter(user, batch_size).run(read_rows(stream, import_format))
+
+
+def _ref(value):
+    return None if value in ('', None) else str(value)
+
+
+def _int_ids(values):
+    ids = set()
+    for value in values:
+        try:
+            ids.add(int(value))
+        except (TypeError, ValueError):
+            pass
+    return ids
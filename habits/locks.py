@@ -0,0 +1,21 @@
+# habits/locks.py
+import uuid
+
+from django.core.cache import cache
+
+
+def acquire_lock(name, timeout):
+    """
+    Распределённая блокировка на общем кэше (в продакшене Redis: add = SET NX EX).
+    Возвращает токен владельца или None, если блокировка уже занята.
+    По истечении `timeout` секунд блокировка снимается сама.
+    """
+    token = uuid.uuid4().hex
+    return token if cache.add(f'lock:{name}', token, timeout) else None
+
+
+def release_lock(name, token):
+    # Снимаем только свою блокировку: чужая могла появиться после истечения нашей
+    key = f'lock:{name}'
+    if token and cache.get(key) == token:
+        cache.delete(key)
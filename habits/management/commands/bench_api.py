@@ -0,0 +1,57 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from habits.benchmarks import ApiBenchmark
+
+
+class Command(BaseCommand):
+    help = ('Замер времени ответа и числа запросов к базе для API привычек, регистрации и задачи '
+            'send_habit_reminders на тестовой базе. Завершается с ошибкой, если превышен бюджет.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--habits', type=int, default=20, help='Привычек на пользователя')
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--budgets', help='JSON-файл с бюджетами {"habit-list": {"queries": 3, "p50_ms": 50}}')
+        parser.add_argument('--report', help='Куда записать отчёт в JSON')
+        parser.add_argument('--no-time-budgets', action='store_true',
+                            help='Проверять только число запросов (для CI на медленных машинах)')
+
+    def handle(self, *args, **options):
+        budgets = {}
+        if options['budgets']:
+            with open(options['budgets']) as f:
+                budgets = json.load(f)
+
+        benchmark = ApiBenchmark(options['users'], options['habits'], options['iterations'], budgets)
+        if options['no_time_budgets']:
+            for budget in benchmark.budgets.values():
+                budget.pop('p50_ms', None)
+
+        setup_test_environment(debug=True)
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+        try:
+            report = benchmark.run()
+        finally:
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+
+        for result in report['results']:
+            line = (f"{result['name']:<22} {str(result['status']):>4}  запросов {result['queries']:>3}  "
+                    f"p50 {result['p50_ms']:>8.2f} мс  p95 {result['p95_ms']:>8.2f} мс")
+            if result.get('telegram_p95_ms') is not None:
+                line += f"  Telegram p95 {result['telegram_p95_ms']:.2f} мс"
+            if result['violations']:
+                line += '  ПРЕВЫШЕНО: ' + '; '.join(result['violations'])
+            self.stdout.write(line)
+
+        if options['report']:
+            with open(options['report'], 'w') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+        if not report['passed']:
+            raise CommandError('Бюджеты производительности превышены')
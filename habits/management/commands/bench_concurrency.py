@@ -0,0 +1,45 @@
+import asyncio
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from habits.benchmarks import load_test
+
+
+class Command(BaseCommand):
+    help = ('Сравнение развёртываний под высокой конкурентностью. Серверы запускаются отдельно, например '
+            'WSGI: gunicorn config.wsgi -w 4 --threads 8 -b :8000, '
+            'ASGI: uvicorn config.asgi:application --workers 4 --port 8001; затем '
+            '--target wsgi=http://127.0.0.1:8000/api/habits/habits/ '
+            '--target asgi=http://127.0.0.1:8001/api/habits/async/habits/')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', required=True, metavar='NAME=URL',
+                            help='Можно указать несколько раз')
+        parser.add_argument('--requests', type=int, default=2000, help='Запросов на каждый уровень конкурентности')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[50, 200, 500])
+        parser.add_argument('--token', help='JWT для закрытых эндпоинтов')
+        parser.add_argument('--report', help='Куда записать отчёт в JSON')
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options['target']:
+            name, sep, url = target.partition('=')
+            if not sep or not url:
+                raise CommandError(f'Ожидается NAME=URL, получено {target}')
+            targets.append((name, url))
+        headers = {'Authorization': f"Bearer {options['token']}"} if options['token'] else None
+
+        report = []
+        for concurrency in options['concurrency']:
+            for name, url in targets:
+                result = asyncio.run(load_test(url, options['requests'], concurrency, headers))
+                result['name'] = name
+                report.append(result)
+                self.stdout.write(
+                    f"{name:<10} c={concurrency:<5} {result['rps']:>9.1f} req/s  p50 {result['p50_ms']:>8.2f} мс  "
+                    f"p95 {result['p95_ms']:>8.2f} мс  p99 {result['p99_ms']:>8.2f} мс  ошибок {result['errors']}")
+
+        if options['report']:
+            with open(options['report'], 'w') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,45 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from habits.delivery import Message, send_many
+from habits.fake_telegram import FakeTelegramServer
+
+
+class Command(BaseCommand):
+    help = 'Замер пропускной способности отправки в Telegram (по умолчанию против локальной заглушки)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=1000)
+        parser.add_argument('--chats', type=int, default=1000)
+        parser.add_argument('--url', help='Адрес API; без него поднимается fake_telegram в этом процессе')
+        parser.add_argument('--latency', type=float, default=0.05, help='Задержка заглушки, секунды')
+        parser.add_argument('--concurrency', type=int)
+        parser.add_argument('--rate', type=float, help='Лимит сообщений в секунду на бота')
+        parser.add_argument('--per-chat-rate', type=float)
+
+    def handle(self, *args, **options):
+        server = None
+        url = options['url']
+        if not url:
+            server = FakeTelegramServer(latency=options['latency']).start()
+            url = server.url
+
+        messages = [Message(str(i % options['chats']), f'Сообщение {i}') for i in range(options['messages'])]
+        started = time.perf_counter()
+        try:
+            results = send_many(messages, token='bench', base_url=url, concurrency=options['concurrency'],
+                                rate=options['rate'], per_chat_rate=options['per_chat_rate'])
+        finally:
+            if server:
+                server.stop()
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(result.latency for result in results)
+        ok = sum(result.ok for result in results)
+        self.stdout.write(f'Отправлено: {ok}/{len(results)} за {elapsed:.2f} с ({len(results) / elapsed:.1f} msg/s)')
+        if latencies:
+            p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0]
+            self.stdout.write(f'Задержка: p50 {statistics.median(latencies) * 1000:.1f} мс, '
+                              f'p95 {p95 * 1000:.1f} мс')
@@ -0,0 +1,28 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from habits.benchmarks import throttle_overhead
+
+
+class Command(BaseCommand):
+    help = ('Накладные расходы ограничения запросов (SlidingWindowThrottle) на запрос: '
+            'без ставки, пропущенный запрос и отказ')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=10000)
+        parser.add_argument('--clients', type=int, default=100, help='Разных IP')
+        parser.add_argument('--redis-url', default=settings.THROTTLE_REDIS_URL,
+                            help='Redis для счётчиков; по умолчанию THROTTLE_REDIS_URL, без него — кэш Django')
+        parser.add_argument('--report', help='Куда записать отчёт в JSON')
+
+    def handle(self, *args, **options):
+        report = throttle_overhead(options['requests'], options['clients'], options['redis_url'])
+        self.stdout.write(f"Хранилище: {report['backend']}, запросов {report['requests']}, IP {report['clients']}")
+        for name, result in report['results'].items():
+            self.stdout.write(f"{name:<8} p50 {result['p50_us']:>8.1f} мкс  p95 {result['p95_us']:>8.1f} мкс  "
+                              f"p99 {result['p99_us']:>8.1f} мкс  max {result['max_us']:>9.1f} мкс")
+        if options['report']:
+            with open(options['report'], 'w') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
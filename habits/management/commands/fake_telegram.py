@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from habits.fake_telegram import FakeTelegramServer
+
+
+class Command(BaseCommand):
+    help = 'Запускает локальную заглушку Telegram Bot API (укажите её в TELEGRAM_API_URL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8081)
+        parser.add_argument('--latency', type=float, default=0.0, help='Задержка ответа, секунды')
+        parser.add_argument('--fail-rate', type=float, default=0.0, help='Доля ответов с ошибкой')
+        parser.add_argument('--fail-status', type=int, default=500)
+
+    def handle(self, *args, **options):
+        server = FakeTelegramServer(options['host'], options['port'], latency=options['latency'],
+                                    fail_rate=options['fail_rate'], fail_status=options['fail_status'])
+        self.stdout.write(f'Fake Telegram API: {server.url}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.stop()
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from config.schema import write_schema
+
+
+class Command(BaseCommand):
+    help = 'Собирает схему OpenAPI (JSON и YAML) для /swagger.json, /swagger/ и /redoc/; запускать при сборке или деплое'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=settings.OPENAPI_SCHEMA_DIR,
+                            help='Каталог для файлов схемы; по умолчанию OPENAPI_SCHEMA_DIR')
+
+    def handle(self, *args, **options):
+        with override_settings(OPENAPI_SCHEMA_DIR=options['dir']):
+            paths = write_schema()
+        for path in paths:
+            self.stdout.write(self.style.SUCCESS(f'Схема записана: {path}'))
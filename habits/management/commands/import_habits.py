@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from habits.importer import IMPORT_FORMATS, detect_format, import_habits
+
+
+class Command(BaseCommand):
+    help = ('Потоковый импорт привычек пользователя из CSV или NDJSON. Колонки — как в выгрузке '
+            '/api/habits/habits/export/, плюс ref и related_ref для ссылок внутри файла.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--user', required=True, help='Имя пользователя-владельца')
+        parser.add_argument('--format', dest='import_format', choices=IMPORT_FORMATS,
+                            help='По умолчанию — по расширению файла')
+        parser.add_argument('--batch-size', type=int, help='Строк в одной пачке bulk_create')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"Пользователь {options['user']} не найден")
+
+        import_format = detect_format(options['path'], options['import_format'])
+        with open(options['path'], 'rb') as f:
+            result = import_habits(user, f, import_format, options['batch_size'])
+
+        for error in result.errors:
+            self.stderr.write(f"строка {error['line']}: {error['errors']}")
+        if result.failed > len(result.errors):
+            self.stderr.write(f'... и ещё {result.failed - len(result.errors)} ошибок')
+        self.stdout.write(f'Создано {result.created}, с ошибками {result.failed}, '
+                          f'{result.elapsed:.2f} с, {result.rows_per_second:.0f} строк/с')
@@ -0,0 +1,28 @@
+import httpx
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Регистрирует вебхук бота для кнопок напоминаний (setWebhook с TELEGRAM_WEBHOOK_SECRET)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='Публичный адрес, например https://example.com/api/habits/telegram/webhook/')
+        parser.add_argument('--max-connections', type=int, default=40)
+
+    def handle(self, *args, **options):
+        if not settings.TELEGRAM_BOT_TOKEN or not settings.TELEGRAM_WEBHOOK_SECRET:
+            raise CommandError('Нужны TELEGRAM_BOT_TOKEN и TELEGRAM_WEBHOOK_SECRET')
+        response = httpx.post(
+            f'{settings.TELEGRAM_API_URL}/bot{settings.TELEGRAM_BOT_TOKEN}/setWebhook',
+            json={
+                'url': options['url'],
+                'secret_token': settings.TELEGRAM_WEBHOOK_SECRET,
+                'allowed_updates': ['callback_query'],
+                'max_connections': options['max_connections'],
+            },
+            timeout=settings.TELEGRAM_TIMEOUT,
+        )
+        if response.status_code != 200:
+            raise CommandError(f'Telegram ответил {response.status_code}: {response.text[:500]}')
+        self.stdout.write(self.style.SUCCESS(f'Вебхук установлен: {options["url"]}'))
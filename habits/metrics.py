@@ -0,0 +1,28 @@
+# habits/metrics.py
+from config.metrics import SharedCounter, SharedGauge, SharedHistogram
+
+# Метрики рассылки напоминаний; пишут воркеры Celery, читает /metrics
+
+LAG_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+SELECTED_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+REMINDER_TASKS = ('tick', 'send_habit_reminders', 'send_reminder_chunk', 'retry_reminder_deliveries',
+                  'drain_notification_outbox', 'apply_telegram_updates')
+
+HABITS_SELECTED = SharedHistogram(
+    'reminder_habits_selected', 'Привычек выбрано за запуск send_habit_reminders', buckets=SELECTED_BUCKETS)
+DELIVERIES = SharedCounter(
+    'reminder_deliveries_total', 'Доставки напоминаний по результату',
+    {'result': ('sent', 'failed', 'held', 'dead', 'skipped')})
+TELEGRAM_LATENCY = SharedHistogram(
+    'telegram_request_duration_seconds', 'Время запроса к Telegram Bot API', {'source': ('reminders', 'outbox')})
+TELEGRAM_CALLBACKS = SharedCounter(
+    'telegram_callbacks_total', 'Нажатия inline-кнопок напоминаний по результату',
+    {'result': ('completed', 'snoozed', 'rejected')})
+TASK_DURATION = SharedHistogram(
+    'reminder_task_duration_seconds', 'Время выполнения задач рассылки; tick — от запуска до сводки',
+    {'task': REMINDER_TASKS}, buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+SCHEDULE_LAG = SharedHistogram(
+    'reminder_schedule_lag_seconds', 'Задержка отправки напоминания относительно его слота', buckets=LAG_BUCKETS)
+LAST_TICK = SharedGauge(
+    'reminder_last_tick_timestamp_seconds', 'Время последнего запуска send_habit_reminders (unix)')
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.18 on 2026-10-17 22:26
+
+from django.db import migrations, models
+from django.utils import timezone
+
+from habits.scheduling import get_user_timezone, next_occurrence
+
+
+def fill_next_reminder_at(apps, schema_editor):
+    Habit = apps.get_model('habits', 'Habit')
+    now = timezone.now()
+    habits = list(Habit.objects.select_related('user').only('time', 'user__timezone'))
+    for habit in habits:
+        habit.next_reminder_at = next_occurrence(habit.time, get_user_timezone(habit.user), now)
+    Habit.objects.bulk_update(habits, ['next_reminder_at'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0003_remove_habit_telegram_chat_id'),
+        ('users', '0002_customuser_timezone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='habit',
+            name='next_reminder_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_next_reminder_at, migrations.RunPython.noop),
+    ]
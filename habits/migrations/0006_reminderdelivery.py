@@ -0,0 +1,37 @@
+# Generated by Django 4.2.18 on 2026-10-17 22:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0005_notification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.DateTimeField()),
+                ('status', models.CharField(choices=[('claimed', 'Взято в работу'), ('sent', 'Отправлено'), ('failed', 'Ошибка')], default='claimed', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('latency', models.FloatField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('claim_token', models.UUIDField(default=uuid.uuid4, editable=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('habit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='habits.habit')),
+            ],
+            options={
+                'ordering': ['slot'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='reminderdelivery',
+            constraint=models.UniqueConstraint(fields=('habit', 'slot'), name='unique_habit_slot'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.18 on 2026-10-17 22:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0006_reminderdelivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reminderdelivery',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='reminderdelivery',
+            name='status',
+            field=models.CharField(choices=[('claimed', 'Взято в работу'), ('sent', 'Отправлено'), ('failed', 'Ошибка'), ('held', 'Отложено'), ('dead', 'Не доставлено')], default='claimed', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='reminderdelivery',
+            index=models.Index(condition=models.Q(('status__in', ['failed', 'held'])), fields=['next_attempt_at'], name='delivery_retry_idx'),
+        ),
+    ]
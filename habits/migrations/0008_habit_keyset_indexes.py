@@ -0,0 +1,21 @@
+# Generated by Django 4.2.18 on 2026-10-17 22:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0007_reminderdelivery_retry'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='habit',
+            index=models.Index(fields=['is_public', 'time', 'id'], name='habit_public_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='habit',
+            index=models.Index(fields=['user', 'time', 'id'], name='habit_user_time_idx'),
+        ),
+    ]
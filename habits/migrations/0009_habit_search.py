@@ -0,0 +1,24 @@
+from django.db import migrations
+
+from habits.search import install_search_indexes, remove_search_indexes
+
+
+def install(apps, schema_editor):
+    install_search_indexes(schema_editor.connection)
+
+
+def remove(apps, schema_editor):
+    remove_search_indexes(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0008_habit_keyset_indexes'),
+    ]
+
+    operations = [
+        # PostgreSQL — pg_trgm и GIN-индексы, SQLite — FTS5 с триггерами; зависит от базы,
+        # поэтому не в Meta.indexes
+        migrations.RunPython(install, remove),
+    ]
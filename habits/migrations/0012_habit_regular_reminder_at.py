@@ -0,0 +1,18 @@
+# Generated by Django 4.2.18 on 2026-10-17 23:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0011_habit_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='habit',
+            name='regular_reminder_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.18 on 2026-10-17 23:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0013_notification_claimed_until'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='reminderdelivery',
+            name='delivery_retry_idx',
+        ),
+        migrations.AddIndex(
+            model_name='reminderdelivery',
+            index=models.Index(condition=models.Q(('status__in', ['claimed', 'failed', 'held'])), fields=['next_attempt_at'], name='delivery_retry_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from datetime import datetime, time, timezone
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_created_at(apps, schema_editor):
+    Habit = apps.get_model('habits', 'Habit')
+    HabitStats = apps.get_model('habits', 'HabitStats')
+    # Время создания раньше не хранилось: берём последнее изменение, но не позже первого выполнения
+    Habit.objects.update(created_at=F('updated_at'))
+    for stats in HabitStats.objects.select_related('habit').iterator():
+        started = datetime.combine(stats.started_on, time.min, tzinfo=timezone.utc)
+        if started < stats.habit.created_at:
+            Habit.objects.filter(pk=stats.habit_id).update(created_at=started)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0014_reminderdelivery_claim_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='habit',
+            name='created_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(backfill_created_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='habit',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+    ]
@@ -1,4 +1,6 @@
 # habits/models.py
+import uuid
+
 from django.conf import settings
 from django.db import models
 from .validators import (
@@ -8,6 +10,7 @@ from .validators import (
     validate_habit_reward,
     validate_pleasant_habit
 )
+from .scheduling import compute_next_reminder
 
 class Habit(models.Model):
     user = models.ForeignKey(
@@ -24,6 +27,13 @@ class Habit(models.Model):
     reward = models.CharField(max_length=255, blank=True)
     duration = models.PositiveIntegerField()  # в секундах
     is_public = models.BooleanField(default=False)
+    # Ближайший момент отправки напоминания (UTC), по нему выбирает задача Celery
+    next_reminder_at = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
+    # Регулярный слот, к которому расписание возвращается после отложенного напоминания
+    regular_reminder_at = models.DateTimeField(null=True, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)  # с этого дня привычка ожидает выполнений
+    # bulk_update не заполняет auto_now: пакетные пути выставляют его сами
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.action} в {self.time} в {self.place}"
@@ -35,9 +45,148 @@ class Habit(models.Model):
         validate_habit_reward(self)
         validate_pleasant_habit(self)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def _schedule_changed(self):
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None or self.next_reminder_at is None:
+            return True
+        return loaded.get('time') != self.time or loaded.get('frequency') != self.frequency
+
     def save(self, *args, **kwargs):
         self.clean()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'time', 'frequency'} & set(update_fields):
+            if self._schedule_changed():
+                self.next_reminder_at = compute_next_reminder(self)
+                self.regular_reminder_at = None
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*update_fields, 'next_reminder_at', 'regular_reminder_at'}
         super().save(*args, **kwargs)
+        # Сохранённые значения становятся «загруженными» для следующего save и сигналов
+        self._loaded_values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
 
     class Meta:
         ordering = ['time']
+        indexes = [
+            # Под keyset-пагинацию по (time, id) для публичного и личного списков
+            models.Index(fields=['is_public', 'time', 'id'], name='habit_public_time_idx'),
+            models.Index(fields=['user', 'time', 'id'], name='habit_user_time_idx'),
+        ]
+
+
+class Notification(models.Model):
+    # Outbox: уведомление пишется в одной транзакции с привычкой и отправляется воркером Celery
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Ожидает отправки'),
+        (STATUS_SENT, 'Отправлено'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
+    habit = models.ForeignKey(Habit, on_delete=models.CASCADE, related_name='notifications')
+    chat_id = models.CharField(max_length=50)
+    text = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    # Аренда: до этого момента строку отправляет взявший её воркер; истёкшую берёт следующий запуск
+    claimed_until = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.chat_id}: {self.text[:50]} ({self.status})"
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['created_at'], condition=models.Q(status='pending'),
+                         name='notification_pending_idx'),
+        ]
+
+
+class ReminderDelivery(models.Model):
+    # Журнал доставки: одна строка на (привычка, слот); кто вставил строку, тот и отправляет
+    STATUS_CLAIMED = 'claimed'  # отправляется; next_attempt_at — конец аренды
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'  # ждёт повторной попытки в next_attempt_at
+    STATUS_HELD = 'held'  # отложено, пока разомкнут circuit breaker
+    STATUS_DEAD = 'dead'  # dead letter: попытки исчерпаны
+    STATUS_CHOICES = [
+        (STATUS_CLAIMED, 'Взято в работу'),
+        (STATUS_SENT, 'Отправлено'),
+        (STATUS_FAILED, 'Ошибка'),
+        (STATUS_HELD, 'Отложено'),
+        (STATUS_DEAD, 'Не доставлено'),
+    ]
+    RETRY_STATUSES = [STATUS_CLAIMED, STATUS_FAILED, STATUS_HELD]
+
+    habit = models.ForeignKey(Habit, on_delete=models.CASCADE, related_name='deliveries')
+    slot = models.DateTimeField()  # запланированное время напоминания (next_reminder_at)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_CLAIMED)
+    attempts = models.PositiveIntegerField(default=0)
+    latency = models.FloatField(null=True, blank=True)  # время ответа Telegram, секунды
+    error = models.TextField(blank=True)
+    claim_token = models.UUIDField(default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.habit_id} @ {self.slot} ({self.status})"
+
+    class Meta:
+        ordering = ['slot']
+        constraints = [
+            models.UniqueConstraint(fields=['habit', 'slot'], name='unique_habit_slot'),
+        ]
+        indexes = [
+            models.Index(fields=['next_attempt_at'], condition=models.Q(status__in=['claimed', 'failed', 'held']),
+                         name='delivery_retry_idx'),
+        ]
+
+
+
+class HabitCompletion(models.Model):
+    # Событие «привычка выполнена» за локальный день пользователя
+    SOURCE_API = 'api'
+    SOURCE_TELEGRAM = 'telegram'
+    SOURCE_CHOICES = [
+        (SOURCE_API, 'API'),
+        (SOURCE_TELEGRAM, 'Telegram'),
+    ]
+
+    habit = models.ForeignKey(Habit, on_delete=models.CASCADE, related_name='completions')
+    date = models.DateField()
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default=SOURCE_API)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.habit_id} выполнена {self.date}"
+
+    class Meta:
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=['habit', 'date'], name='unique_habit_completion_date'),
+        ]
+
+
+class HabitStats(models.Model):
+    # Агрегаты по HabitCompletion, обновляются при каждом событии; чтение — одна строка
+    habit = models.OneToOneField(Habit, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    started_on = models.DateField()  # с этого дня считается ожидаемое число выполнений (день создания привычки)
+    completions = models.PositiveIntegerField(default=0)
+    current_streak = models.PositiveIntegerField(default=0)  # на день last_completed_on
+    longest_streak = models.PositiveIntegerField(default=0)
+    last_completed_on = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.habit_id}: {self.completions} выполнений, серия {self.current_streak}"
@@ -0,0 +1,141 @@
+# habits/pagination.py
+import base64
+from datetime import time
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset-пагинация по (time, id): страница выбирается условием по последней строке
+    предыдущей страницы, без OFFSET и без COUNT, поэтому глубокие страницы стоят как первая.
+    Работает по индексам (user, time, id) и (is_public, time, id).
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def encode_cursor(self, position):
+        raw = f'{position[0].isoformat()}|{position[1]}'
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw_time, raw_id = base64.urlsafe_b64decode(encoded.encode()).decode().split('|')
+            return time.fromisoformat(raw_time), int(raw_id)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_page_queryset(self, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by('time', 'id')
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            position_time, position_id = position
+            # time >= t задаёт диапазон по индексу, остальное отсекает уже показанные строки
+            queryset = queryset.filter(
+                Q(time__gte=position_time) & (Q(time__gt=position_time) | Q(id__gt=position_id)))
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, rows):
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.get_page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request):
+        return self.set_page([row async for row in self.get_page_queryset(queryset, request)])
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor((last.time, last.id)))
+
+    def get_paginated_data(self, data):
+        return {'next': self.get_next_link(), 'results': data}
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class KeysetPaginationMixin:
+    """Включает KeysetPagination, если в запросе есть параметр cursor (первая страница — ?cursor=)."""
+    keyset_pagination_class = KeysetPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            request = getattr(self, 'request', None)
+            if request is not None and self.keyset_pagination_class.cursor_query_param in request.query_params:
+                self._paginator = self.keyset_pagination_class()
+        return super().paginator
+
+
+class AsyncPageNumberPagination(PageNumberPagination):
+    """Постраничная выдача для async-представлений: COUNT и страница через асинхронный ORM."""
+
+    async def apaginate_queryset(self, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        try:
+            self.number = int(request.query_params.get(self.page_query_param, 1))
+            if self.number < 1:
+                raise ValueError
+        except ValueError:
+            raise NotFound(self.invalid_page_message)
+        self.count = await queryset.acount()
+        offset = (self.number - 1) * self.page_size
+        self.page = [row async for row in queryset[offset:offset + self.page_size]]
+        if self.number > 1 and not self.page:
+            raise NotFound(self.invalid_page_message)
+        return self.page
+
+    def get_next_link(self):
+        if self.number * self.page_size >= self.count:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.number + 1)
+
+    def get_previous_link(self):
+        if self.number == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.number - 1)
+
+    def get_paginated_data(self, data):
+        return {'count': self.count, 'next': self.get_next_link(), 'previous': self.get_previous_link(),
+                'results': data}
+
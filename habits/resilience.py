@@ -0,0 +1,70 @@
+# habits/resilience.py
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def backoff_delay(attempts, retry_after=None):
+    """
+    Задержка перед следующей попыткой (секунды): экспонента от числа попыток
+    с полным jitter, не меньше retry_after из ответа Telegram.
+    """
+    ceiling = min(settings.REMINDER_RETRY_MAX_DELAY, settings.REMINDER_RETRY_BASE_DELAY * 2 ** (attempts - 1))
+    delay = random.uniform(settings.REMINDER_RETRY_BASE_DELAY / 2, ceiling)
+    return max(delay, retry_after or 0)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker, общий для всех воркеров (состояние в кэше Django, в продакшене Redis).
+
+    Считает успешные и неудачные запросы в окне `window` секунд; если при объёме не меньше
+    `min_requests` доля ошибок достигает `threshold`, размыкается на `cooldown` секунд.
+    После паузы счётчики начинаются заново (half-open): несколько ошибок подряд снова размыкают цепь.
+    """
+
+    def __init__(self, name, threshold=None, min_requests=None, window=None, cooldown=None):
+        self.name = name
+        self.threshold = threshold or settings.TELEGRAM_BREAKER_THRESHOLD
+        self.min_requests = min_requests or settings.TELEGRAM_BREAKER_MIN_REQUESTS
+        self.window = window or settings.TELEGRAM_BREAKER_WINDOW
+        self.cooldown = cooldown or settings.TELEGRAM_BREAKER_COOLDOWN
+
+    def _key(self, suffix):
+        return f'breaker:{self.name}:{suffix}'
+
+    def open_until(self):
+        """Момент (unix time), до которого цепь разомкнута, или None."""
+        until = cache.get(self._key('open_until'))
+        return until if until and until > time.time() else None
+
+    def is_open(self):
+        return self.open_until() is not None
+
+    def _incr(self, key, delta):
+        if not delta:
+            return cache.get(key, 0)
+        # add не перезапишет счётчик, созданный другим воркером
+        cache.add(key, 0, self.window * 2)
+        try:
+            return cache.incr(key, delta)
+        except ValueError:
+            cache.set(key, delta, self.window * 2)
+            return delta
+
+    def record(self, successes, failures):
+        bucket = int(time.time() // self.window)
+        total = self._incr(self._key(f'total:{bucket}'), successes + failures)
+        failed = self._incr(self._key(f'failed:{bucket}'), failures)
+        if total >= self.min_requests and failed / total >= self.threshold:
+            self.trip()
+
+    def trip(self):
+        cache.set(self._key('open_until'), time.time() + self.cooldown, self.cooldown)
+        bucket = int(time.time() // self.window)
+        cache.delete_many([self._key(f'total:{bucket}'), self._key(f'failed:{bucket}')])
+
+
+telegram_breaker = CircuitBreaker('telegram')
@@ -0,0 +1,50 @@
+# habits/scheduling.py
+from datetime import datetime, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+from django.utils import timezone
+
+
+def get_user_timezone(user):
+    try:
+        return ZoneInfo(getattr(user, 'timezone', None) or settings.TIME_ZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(settings.TIME_ZONE)
+
+
+def _local_slot(day, habit_time, tz):
+    # Слот привычки в локальном дне пользователя, переведённый в UTC
+    return datetime.combine(day, habit_time, tzinfo=tz).astimezone(dt_timezone.utc)
+
+
+def next_occurrence(habit_time, tz, after):
+    """Ближайший момент строго после `after`, когда у пользователя наступает `habit_time`."""
+    day = after.astimezone(tz).date()
+    slot = _local_slot(day, habit_time, tz)
+    if slot <= after:
+        slot = _local_slot(day + timedelta(days=1), habit_time, tz)
+    return slot
+
+
+def compute_next_reminder(habit, after=None):
+    return next_occurrence(habit.time, get_user_timezone(habit.user), after or timezone.now())
+
+
+def advance_reminder(habit, slot, now=None):
+    """
+    Следующий слот после отправленного `slot`: через `frequency` дней.
+    Слоты, которые уже в прошлом, пропускаются.
+    """
+    now = now or timezone.now()
+    tz = get_user_timezone(habit.user)
+    frequency = max(habit.frequency, 1)
+    day = slot.astimezone(tz).date() + timedelta(days=frequency)
+    candidate = _local_slot(day, habit.time, tz)
+    if candidate <= now:
+        behind = (now.astimezone(tz).date() - day).days
+        day += timedelta(days=behind - behind % frequency)
+        candidate = _local_slot(day, habit.time, tz)
+        if candidate <= now:
+            candidate = _local_slot(day + timedelta(days=frequency), habit.time, tz)
+    return candidate
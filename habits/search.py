@@ -0,0 +1,130 @@
+# habits/search.py
+import logging
+import re
+
+from django.db import OperationalError, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import BaseFilterBackend
+
+logger = logging.getLogger(__name__)
+
+# Поиск по action и place.
+# PostgreSQL: icontains (UPPER(...) LIKE) по GIN-индексам pg_trgm на UPPER(action) и UPPER(place).
+# SQLite: внешняя таблица FTS5 habits_habit_fts, которую поддерживают триггеры; поиск по префиксам слов.
+# Остальные базы и SQLite без FTS5 — обычный icontains
+
+POSTGRES_INDEXES = {
+    'habit_action_trgm_idx': 'action',
+    'habit_place_trgm_idx': 'place',
+}
+
+SQLITE_FTS_TABLE = 'habits_habit_fts'
+SQLITE_TRIGGERS = {
+    'habits_habit_fts_ai': """
+        CREATE TRIGGER habits_habit_fts_ai AFTER INSERT ON habits_habit BEGIN
+            INSERT INTO habits_habit_fts(rowid, action, place) VALUES (new.id, new.action, new.place);
+        END""",
+    'habits_habit_fts_ad': """
+        CREATE TRIGGER habits_habit_fts_ad AFTER DELETE ON habits_habit BEGIN
+            INSERT INTO habits_habit_fts(habits_habit_fts, rowid, action, place)
+            VALUES ('delete', old.id, old.action, old.place);
+        END""",
+    'habits_habit_fts_au': """
+        CREATE TRIGGER habits_habit_fts_au AFTER UPDATE OF action, place ON habits_habit BEGIN
+            INSERT INTO habits_habit_fts(habits_habit_fts, rowid, action, place)
+            VALUES ('delete', old.id, old.action, old.place);
+            INSERT INTO habits_habit_fts(rowid, action, place) VALUES (new.id, new.action, new.place);
+        END""",
+}
+
+_sqlite_fts = {}  # alias -> есть ли FTS5-таблица
+
+
+def install_search_indexes(connection):
+    """Создаёт поисковые индексы для базы `connection`; повторный вызов ничего не ломает."""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            for name, column in POSTGRES_INDEXES.items():
+                cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON habits_habit '
+                               f'USING gin (UPPER({column}) gin_trgm_ops)')
+    elif connection.vendor == 'sqlite':
+        install_sqlite_fts(connection)
+
+
+def remove_search_indexes(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for name in POSTGRES_INDEXES:
+                cursor.execute(f'DROP INDEX IF EXISTS {name}')
+        elif connection.vendor == 'sqlite':
+            for name in SQLITE_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(f'DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}')
+    _sqlite_fts.pop(connection.alias, None)
+
+
+def install_sqlite_fts(connection):
+    # SQLite пересоздаёт таблицу при ALTER в миграциях и теряет триггеры,
+    # поэтому это же вызывается после каждого migrate
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'habits_habit'")
+        existing = {row[0] for row in cursor.fetchall()}
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [SQLITE_FTS_TABLE])
+        if cursor.fetchone() and set(SQLITE_TRIGGERS) <= existing:
+            return
+        try:
+            cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} USING fts5("
+                           f"action, place, content='habits_habit', content_rowid='id', tokenize='unicode61')")
+        except OperationalError as exc:
+            logger.warning('FTS5 недоступен, поиск привычек работает через LIKE: %s', exc)
+            return
+        for name, sql in SQLITE_TRIGGERS.items():
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(sql)
+        cursor.execute(f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')")
+    _sqlite_fts.pop(connection.alias, None)
+
+
+def has_sqlite_fts(connection):
+    if connection.alias not in _sqlite_fts:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [SQLITE_FTS_TABLE])
+            _sqlite_fts[connection.alias] = cursor.fetchone() is not None
+    return _sqlite_fts[connection.alias]
+
+
+def fts_query(query):
+    # Каждое слово — префикс в кавычках, чтобы операторы FTS5 в запросе не разбирались
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', query))
+
+
+def search_habits(queryset, query):
+    query = query.strip()
+    if not query:
+        return queryset
+    connection = connections[queryset.db]
+    if connection.vendor == 'sqlite' and has_sqlite_fts(connection):
+        match = fts_query(query)
+        if match:
+            return queryset.filter(id__in=RawSQL(
+                f'SELECT rowid FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s', [match]))
+    return queryset.filter(Q(action__icontains=query) | Q(place__icontains=query))
+
+
+class HabitSearchFilter(BaseFilterBackend):
+    """?search= по action и place."""
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        return search_habits(queryset, request.query_params.get(self.search_param, ''))
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Поиск по действию и месту',
+            'schema': {'type': 'string'},
+        }]
@@ -1,13 +1,15 @@
 from rest_framework import serializers
+
+from config.performance import TimedSerializerMixin
 from .models import Habit
 
 
-class HabitSerializer(serializers.ModelSerializer):
+class HabitSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Habit
         fields = ['id', 'user', 'place', 'time', 'action', 'is_pleasant', 'related_habit',
-                  'frequency', 'reward', 'duration', 'is_public']
-        read_only_fields = ['user']
+                  'frequency', 'reward', 'duration', 'is_public', 'updated_at']
+        read_only_fields = ['user', 'updated_at']
 
     def validate(self, data):
         if data.get('is_pleasant'):
@@ -41,7 +43,21 @@ class HabitSerializer(serializers.ModelSerializer):
         return data
 
 
-class PublicHabitSerializer(serializers.ModelSerializer):
+class PublicHabitSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Habit
         fields = ['id', 'place', 'time', 'action', 'duration']
+
+
+class PrefetchedHabitField(serializers.PrimaryKeyRelatedField):
+    # Берёт связанную привычку из заранее загруженного словаря context['related_habits'], без запроса на элемент
+    def to_internal_value(self, data):
+        try:
+            return self.context['related_habits'][int(data)]
+        except (KeyError, TypeError, ValueError):
+            self.fail('does_not_exist', pk_value=data)
+
+
+class HabitBulkSerializer(HabitSerializer):
+    related_habit = PrefetchedHabitField(queryset=Habit.objects.all(), allow_null=True, required=False)
+
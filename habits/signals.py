@@ -0,0 +1,70 @@
+# habits/signals.py
+from django.conf import settings
+from django.db import connections
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import PRIVATE_FIELDS, PUBLIC_FIELDS, PUBLIC_HABITS_VERSION_KEY, bump_version, user_habits_version_key
+from .models import Habit
+from .scheduling import compute_next_reminder
+from .search import SQLITE_FTS_TABLE, install_sqlite_fts
+
+
+@receiver(post_save, sender=Habit)
+def invalidate_user_habits_on_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= PRIVATE_FIELDS:
+        return
+    bump_version(user_habits_version_key(instance.user_id))
+
+
+@receiver(post_delete, sender=Habit)
+def invalidate_user_habits_on_delete(sender, instance, **kwargs):
+    bump_version(user_habits_version_key(instance.user_id))
+
+
+@receiver(post_save, sender=Habit)
+def invalidate_public_habits_on_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not PUBLIC_FIELDS & set(update_fields):
+        return
+    # Сбрасываем и когда привычка перестала быть публичной
+    was_public = getattr(instance, '_loaded_values', {}).get('is_public')
+    if instance.is_public or was_public:
+        bump_version(PUBLIC_HABITS_VERSION_KEY)
+
+
+@receiver(post_delete, sender=Habit)
+def invalidate_public_habits_on_delete(sender, instance, **kwargs):
+    if instance.is_public:
+        bump_version(PUBLIC_HABITS_VERSION_KEY)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def reschedule_reminders_on_timezone_change(sender, instance, created, update_fields=None, **kwargs):
+    # Время привычки — локальное: после смены часового пояса слоты пересчитываются одним bulk_update
+    if created or (update_fields is not None and 'timezone' not in update_fields) or not instance.timezone_changed():
+        return
+    now = timezone.now()
+    habits = list(Habit.objects.filter(user=instance))
+    for habit in habits:
+        habit.user = instance
+        next_slot = compute_next_reminder(habit, now)
+        if habit.regular_reminder_at is not None:
+            habit.regular_reminder_at = next_slot  # отложенное напоминание остаётся в силе
+        else:
+            habit.next_reminder_at = next_slot
+    Habit.objects.bulk_update(habits, ['next_reminder_at', 'regular_reminder_at'])
+
+
+@receiver(post_migrate)
+def restore_sqlite_search(sender, using, **kwargs):
+    # Пересоздание таблицы habits_habit в миграциях SQLite удаляет триггеры FTS5
+    connection = connections[using]
+    if sender.name != 'habits' or connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [SQLITE_FTS_TABLE])
+        if cursor.fetchone() is None:
+            return
+    install_sqlite_fts(connection)
+
@@ -0,0 +1,144 @@
+# habits/stats.py
+from django.db import transaction
+from django.utils import timezone
+
+from .models import HabitCompletion, HabitStats
+from .scheduling import get_user_timezone
+
+
+def local_today(user, now=None):
+    return (now or timezone.now()).astimezone(get_user_timezone(user)).date()
+
+
+def active_since(habit):
+    # Локальный день создания привычки: с него считается ожидаемое число выполнений
+    return local_today(habit.user, habit.created_at)
+
+
+def _apply(stats, day, frequency):
+    # Серия продолжается, если между выполнениями не больше frequency дней
+    if stats.last_completed_on is not None and (day - stats.last_completed_on).days <= frequency:
+        stats.current_streak += 1
+    else:
+        stats.current_streak = 1
+    stats.longest_streak = max(stats.longest_streak, stats.current_streak)
+    stats.last_completed_on = day
+    stats.completions += 1
+
+
+def _rebuild(stats, habit):
+    stats.completions = stats.current_streak = stats.longest_streak = 0
+    stats.last_completed_on = None
+    for day in habit.completions.order_by('date').values_list('date', flat=True):
+        _apply(stats, day, habit.frequency)
+
+
+def record_completion(habit, day, source=HabitCompletion.SOURCE_API):
+    """
+    Записывает выполнение привычки за локальный день и обновляет HabitStats.
+    Возвращает (stats, created); повторная отметка за тот же день ничего не меняет.
+    """
+    with transaction.atomic():
+        HabitStats.objects.get_or_create(habit=habit, defaults={'started_on': min(active_since(habit), day)})
+        stats = HabitStats.objects.select_for_update().get(pk=habit.pk)
+        _, created = HabitCompletion.objects.get_or_create(habit=habit, date=day, defaults={'source': source})
+        if not created:
+            return stats, False
+        if stats.last_completed_on is None or day > stats.last_completed_on:
+            _apply(stats, day, habit.frequency)
+        else:
+            # Отметка задним числом: серии пересчитываются по истории — редкий путь записи
+            _rebuild(stats, habit)
+        stats.started_on = min(stats.started_on, day)
+        stats.save()
+    return stats, True
+
+
+def record_completions(items, source=HabitCompletion.SOURCE_API):
+    """
+    Пакетный вариант record_completion для пар (habit, day): несколько запросов на всю пачку
+    вместо транзакции на каждую отметку. Возвращает число новых выполнений.
+    """
+    days = {}
+    for habit, day in items:
+        days.setdefault(habit.id, (habit, set()))[1].add(day)
+    if not days:
+        return 0
+
+    with transaction.atomic():
+        HabitStats.objects.bulk_create(
+            [HabitStats(habit_id=habit_id, started_on=min(active_since(habit), *habit_days))
+             for habit_id, (habit, habit_days) in days.items()],
+            ignore_conflicts=True,
+        )
+        stats_by_habit = HabitStats.objects.select_for_update().in_bulk(list(days))
+        existing = set(
+            HabitCompletion.objects.filter(habit_id__in=list(days), date__in={d for _, ds in days.values() for d in ds})
+            .values_list('habit_id', 'date')
+        )
+        completions, changed = [], []
+        now = timezone.now()
+        for habit_id, (habit, habit_days) in days.items():
+            new_days = sorted(day for day in habit_days if (habit_id, day) not in existing)
+            if not new_days:
+                continue
+            stats = stats_by_habit[habit_id]
+            completions.extend(HabitCompletion(habit_id=habit_id, date=day, source=source) for day in new_days)
+            if stats.last_completed_on is None or new_days[0] > stats.last_completed_on:
+                for day in new_days:
+                    _apply(stats, day, habit.frequency)
+                rebuild = False
+            else:
+                rebuild = True
+            stats.started_on = min(stats.started_on, new_days[0])
+            stats.updated_at = now  # bulk_update не заполняет auto_now
+            changed.append((stats, habit, rebuild))
+        HabitCompletion.objects.bulk_create(completions, ignore_conflicts=True)
+        for stats, habit, rebuild in changed:
+            if rebuild:
+                _rebuild(stats, habit)
+        HabitStats.objects.bulk_update(
+            [stats for stats, _, _ in changed],
+            ['started_on', 'completions', 'current_streak', 'longest_streak', 'last_completed_on', 'updated_at'],
+        )
+    return len(completions)
+
+
+def get_stats(habit):
+    try:
+        return habit.stats
+    except HabitStats.DoesNotExist:
+        return None
+
+
+def habit_stats_data(habit, stats, today):
+    """Статистика привычки на день `today` только по строке HabitStats."""
+    data = {'habit': habit.id, 'completions': 0, 'expected': 0, 'current_streak': 0, 'longest_streak': 0,
+            'last_completed_on': None, 'completion_rate': 0.0}
+    if stats is None:
+        return data
+    expected = max((today - stats.started_on).days // habit.frequency + 1, 1)
+    missed = stats.last_completed_on is None or (today - stats.last_completed_on).days > habit.frequency
+    data.update(
+        completions=stats.completions,
+        expected=expected,
+        current_streak=0 if missed else stats.current_streak,
+        longest_streak=stats.longest_streak,
+        last_completed_on=stats.last_completed_on,
+        completion_rate=round(min(stats.completions / expected, 1.0), 3),
+    )
+    return data
+
+
+def user_stats_data(habits, today):
+    """Сводка по привычкам пользователя (habits — с select_related('stats'))."""
+    per_habit = [habit_stats_data(habit, get_stats(habit), today) for habit in habits]
+    completions = sum(item['completions'] for item in per_habit)
+    expected = sum(item['expected'] for item in per_habit)
+    return {
+        'completions': completions,
+        'completion_rate': round(min(completions / expected, 1.0), 3) if expected else 0.0,
+        'current_streak': max((item['current_streak'] for item in per_habit), default=0),
+        'longest_streak': max((item['longest_streak'] for item in per_habit), default=0),
+        'habits': per_habit,
+    }
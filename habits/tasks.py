@@ -1,20 +1,331 @@
 # habits/tasks.py
-from celery import shared_task
-from .models import Habit
-from .telegram_bot import send_reminder
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from celery import chord, group, shared_task
+from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from config.replicas import use_primary
+from .delivery import Message, send_many
+from .locks import acquire_lock, release_lock
+from .metrics import (DELIVERIES, HABITS_SELECTED, LAST_TICK, SCHEDULE_LAG, TASK_DURATION, TELEGRAM_CALLBACKS,
+                      TELEGRAM_LATENCY)
+from .models import Habit, Notification, ReminderDelivery
+from .resilience import backoff_delay, telegram_breaker
+from .scheduling import advance_reminder
+from .telegram_bot import build_digests
+from .updates import apply_updates, get_queue
+
+logger = get_task_logger(__name__)
+
+REMINDERS_LOCK = 'send_habit_reminders'
+UPDATES_SCHEDULED_KEY = 'telegram:updates:scheduled'
+# Постановка задач из веб-запроса: недоступный брокер не должен держать ответ секундами
+ENQUEUE_RETRY_POLICY = {'max_retries': 1, 'interval_start': 0, 'interval_step': 0.2, 'interval_max': 0.2}
+
+
+def due_habits(now):
+    # Привычки, чей слот уже наступил (индекс по next_reminder_at),
+    # только у пользователей с telegram_chat_id
+    return (
+        Habit.objects.filter(next_reminder_at__lte=now, user__telegram_chat_id__isnull=False)
+        .exclude(user__telegram_chat_id='')
+    )
+
+
+def chunk_by_user(rows, size):
+    """
+    Делит пары (habit_id, user_id), отсортированные по user_id, на пачки примерно по `size`.
+    Привычки одного пользователя всегда попадают в одну пачку.
+    """
+    chunk, last_user_id = [], None
+    for habit_id, user_id in rows:
+        if len(chunk) >= size and user_id != last_user_id:
+            yield chunk
+            chunk = []
+        chunk.append(habit_id)
+        last_user_id = user_id
+    if chunk:
+        yield chunk
 
 
 @shared_task
+@TASK_DURATION.time(task='send_habit_reminders')
 def send_habit_reminders():
-    # Фильтруем привычки, у которых есть пользователь с telegram_chat_id
-    habits = Habit.objects.select_related ( 'user' ).exclude ( user__telegram_chat_id__isnull = True )
+    # Координатор: раздаёт наступившие привычки пачками по воркерам.
+    # Пока не завершилась рассылка предыдущего запуска, новые не стартуют
+    lock_token = acquire_lock(REMINDERS_LOCK, settings.REMINDER_LOCK_TIMEOUT)
+    if lock_token is None:
+        logger.info('Предыдущая рассылка напоминаний ещё идёт, пропускаем запуск')
+        return 0
+
+    try:
+        now = timezone.now()
+        LAST_TICK.set(now.timestamp())
+        # После простоя копится хвост: берём самые старые слоты первыми и не больше
+        # REMINDER_MAX_PER_TICK за запуск, остальное — в следующих запусках
+        rows = list(
+            due_habits(now).order_by('next_reminder_at', 'id')
+            .values_list('id', 'user_id')[:settings.REMINDER_MAX_PER_TICK]
+        )
+        if len(rows) == settings.REMINDER_MAX_PER_TICK:
+            logger.warning('Режим догоняния: за запуск берём %s привычек, остальные ждут', len(rows))
+        HABITS_SELECTED.observe(len(rows))
+        rows.sort(key=lambda row: row[1])
+        chunks = list(chunk_by_user(rows, settings.REMINDER_CHUNK_SIZE))
+        if not chunks:
+            release_lock(REMINDERS_LOCK, lock_token)
+            return 0
+
+        header = group(send_reminder_chunk.s(habit_ids, now.isoformat()) for habit_ids in chunks)
+        # Блокировку снимает summarize_reminders, когда отработают все пачки,
+        # а если пачка упала и callback chord не запустится — release_reminders_lock
+        callback = summarize_reminders.s(lock_token=lock_token, started=now.isoformat())
+        chord(header)(callback.on_error(release_reminders_lock.si(lock_token)))
+    except Exception:
+        release_lock(REMINDERS_LOCK, lock_token)
+        raise
+    return len(chunks)
+
+
+def claim_slots(habits):
+    """
+    Записывает в журнал доставки (привычка, слот) одним bulk_create и возвращает
+    {habit_id: ReminderDelivery} только для строк, вставленных этим вызовом.
+    Уникальный ключ (habit, slot) гарантирует, что слот достанется ровно одному воркеру.
+    Строка берётся под аренду: если воркер не запишет результат, её подберёт retry_reminder_deliveries.
+    """
+    claim_token = uuid.uuid4()
+    lease = timezone.now() + timedelta(seconds=settings.REMINDER_TASK_TIME_LIMIT)
+    ReminderDelivery.objects.bulk_create(
+        [ReminderDelivery(habit=habit, slot=habit.next_reminder_at, claim_token=claim_token, next_attempt_at=lease)
+         for habit in habits],
+        ignore_conflicts=True,
+    )
+    claimed = ReminderDelivery.objects.filter(habit_id__in=[habit.id for habit in habits], claim_token=claim_token)
+    return {delivery.habit_id: delivery for delivery in claimed}
+
+
+def deliver(deliveries, now):
+    """
+    Отправляет напоминания по строкам журнала (с загруженными habit и habit.user)
+    и записывает результат: отправлено, повтор по экспоненте с jitter или dead letter.
+    Пока circuit breaker разомкнут, сообщения откладываются без расхода попыток.
+    """
+    counts = {'sent': 0, 'failed': 0, 'held': 0, 'dead': 0, 'messages': 0}
+    fields = ['status', 'attempts', 'latency', 'error', 'sent_at', 'next_attempt_at']
+
+    open_until = telegram_breaker.open_until()
+    if open_until:
+        resume_at = datetime.fromtimestamp(open_until, tz=dt_timezone.utc)
+        for delivery in deliveries:
+            delivery.status = ReminderDelivery.STATUS_HELD
+            delivery.next_attempt_at = resume_at
+        counts['held'] = len(deliveries)
+        ReminderDelivery.objects.bulk_update(deliveries, fields)
+        DELIVERIES.inc(counts['held'], result='held')
+        return counts
+
+    by_habit = {delivery.habit_id: delivery for delivery in deliveries}
+    # Одна сводка на чат вместо сообщения на каждую привычку
+    results = send_many(build_digests([delivery.habit for delivery in deliveries]))
+    telegram_breaker.record(sum(r.ok for r in results), sum(not r.ok for r in results))
+    TELEGRAM_LATENCY.observe_many([result.latency for result in results], source='reminders')
+
+    lags = []
+    for result in results:
+        counts['messages'] += 1
+        sent_at = timezone.now()
+        for habit_id in result.message.habit_ids:
+            delivery = by_habit[habit_id]
+            delivery.attempts += 1
+            delivery.latency = result.latency
+            if result.ok:
+                delivery.status = ReminderDelivery.STATUS_SENT
+                delivery.sent_at = sent_at
+                delivery.next_attempt_at = None
+                counts['sent'] += 1
+                lags.append((sent_at - delivery.slot).total_seconds())
+            elif delivery.attempts >= settings.REMINDER_MAX_ATTEMPTS:
+                delivery.status = ReminderDelivery.STATUS_DEAD
+                delivery.error = result.error
+                delivery.next_attempt_at = None
+                counts['dead'] += 1
+            else:
+                delivery.status = ReminderDelivery.STATUS_FAILED
+                delivery.error = result.error
+                delivery.next_attempt_at = now + timedelta(
+                    seconds=backoff_delay(delivery.attempts, result.retry_after))
+                counts['failed'] += 1
+        if not result.ok:
+            logger.warning('Ошибка отправки уведомления для %s: %s', result.message.chat_id, result.error)
+
+    ReminderDelivery.objects.bulk_update(deliveries, fields)
+    # Задержка от слота до отправки: растёт, когда рассылка не успевает за расписанием
+    SCHEDULE_LAG.observe_many(lags)
+    for result in ('sent', 'failed', 'dead'):
+        DELIVERIES.inc(counts[result], result=result)
+    return counts
+
+
+@shared_task(soft_time_limit=settings.REMINDER_TASK_TIME_LIMIT)
+@TASK_DURATION.time(task='send_reminder_chunk')
+def send_reminder_chunk(habit_ids, now):
+    now = parse_datetime(now)
+    # Привычки, которые уже успели сдвинуть на следующий слот или чей слот
+    # взял другой воркер, пропускаем. Реплика годится только координатору для выбора id:
+    # по этим строкам пишутся слот, текст и следующий next_reminder_at, поэтому читаем с default
+    with use_primary():
+        habits = list(due_habits(now).select_related('user').filter(id__in=habit_ids))
+    deliveries = claim_slots(habits)
+    habits = [habit for habit in habits if habit.id in deliveries]
 
     for habit in habits:
-        telegram_chat_id = habit.user.telegram_chat_id  # Берем chat_id через пользователя
-        if telegram_chat_id:
-            response = send_reminder ( telegram_chat_id,habit.action )
-
-            # Проверяем статус ответа
-            if response.status_code != 200:
-                # Обрабатываем ошибку, например, логируем
-                print ( f"Ошибка отправки уведомления для {telegram_chat_id}: {response.text}" )
+        deliveries[habit.id].habit = habit
+        if habit.regular_reminder_at is not None:
+            # Отправляется отложенное напоминание: возвращаемся к регулярному слоту
+            slot, habit.regular_reminder_at = habit.regular_reminder_at, None
+            habit.next_reminder_at = slot if slot > now else advance_reminder(habit, slot, now)
+        else:
+            # Сдвигаем привычку на следующий слот с учётом frequency
+            habit.next_reminder_at = advance_reminder(habit, habit.next_reminder_at, now)
+    Habit.objects.bulk_update(habits, ['next_reminder_at', 'regular_reminder_at'])
+
+    counts = deliver(list(deliveries.values()), now)
+    counts['skipped'] = len(habit_ids) - len(habits)
+    DELIVERIES.inc(counts['skipped'], result='skipped')
+    return counts
+
+
+@shared_task(soft_time_limit=settings.REMINDER_TASK_TIME_LIMIT)
+@TASK_DURATION.time(task='retry_reminder_deliveries')
+def retry_reminder_deliveries():
+    # Повторяет неудачные и отложенные доставки, у которых подошло время, и взятые
+    # в работу, чья аренда истекла (воркер упал или превысил время до записи результата)
+    now = timezone.now()
+    with transaction.atomic():
+        deliveries = list(
+            ReminderDelivery.objects.select_for_update(skip_locked=True, of=('self',))
+            .select_related('habit__user')
+            .filter(status__in=ReminderDelivery.RETRY_STATUSES, next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:settings.REMINDER_RETRY_BATCH_SIZE]
+        )
+        # Аренда: параллельный запуск не возьмёт эти строки, пока идёт отправка
+        lease = now + timedelta(seconds=settings.REMINDER_TASK_TIME_LIMIT)
+        ReminderDelivery.objects.filter(pk__in=[d.pk for d in deliveries]).update(next_attempt_at=lease)
+    abandoned = sum(delivery.status == ReminderDelivery.STATUS_CLAIMED for delivery in deliveries)
+    if abandoned:
+        logger.warning('Подобрано доставок с истёкшей арендой: %s', abandoned)
+
+    return deliver(deliveries, now)
+
+
+@shared_task(ignore_result=True)
+def release_reminders_lock(lock_token):
+    logger.warning('Пачка напоминаний завершилась с ошибкой, снимаем блокировку рассылки')
+    release_lock(REMINDERS_LOCK, lock_token)
+
+
+@shared_task
+def summarize_reminders(results, lock_token=None, started=None):
+    release_lock(REMINDERS_LOCK, lock_token)
+    if started:
+        TASK_DURATION.observe((timezone.now() - parse_datetime(started)).total_seconds(), task='tick')
+    totals = Counter({'sent': 0, 'failed': 0, 'held': 0, 'dead': 0, 'skipped': 0, 'messages': 0})
+    for counts in results:
+        totals.update(counts)
+    logger.info('Напоминания: отправлено %(sent)s, ошибок %(failed)s, отложено %(held)s, '
+                'не доставлено %(dead)s, пропущено %(skipped)s, сообщений %(messages)s', totals)
+    return dict(totals)
+
+
+def enqueue_outbox_drain():
+    # Вызывается после коммита; если брокер недоступен, outbox разберёт задача по расписанию
+    try:
+        drain_notification_outbox.apply_async(retry_policy=ENQUEUE_RETRY_POLICY)
+    except Exception as exc:
+        logger.warning('Не удалось поставить отправку outbox в очередь: %s', exc)
+
+
+@shared_task(ignore_result=True)
+@TASK_DURATION.time(task='drain_notification_outbox')
+def drain_notification_outbox():
+    # Пока Telegram сбоит, уведомления остаются в outbox
+    if telegram_breaker.is_open():
+        return 0
+
+    # Берём пачку под аренду в короткой транзакции: отправка идёт без блокировок строк
+    now = timezone.now()
+    with transaction.atomic():
+        notifications = list(
+            Notification.objects.select_for_update(skip_locked=True)
+            .filter(Q(claimed_until__isnull=True) | Q(claimed_until__lte=now), status=Notification.STATUS_PENDING)
+            .order_by('created_at')[:settings.OUTBOX_BATCH_SIZE]
+        )
+        lease = now + timedelta(seconds=settings.OUTBOX_LEASE)
+        Notification.objects.filter(pk__in=[n.pk for n in notifications]).update(claimed_until=lease)
+
+    messages = [Message(n.chat_id, n.text, [n.habit_id]) for n in notifications]
+    results = send_many(messages)
+    telegram_breaker.record(sum(r.ok for r in results), sum(not r.ok for r in results))
+    TELEGRAM_LATENCY.observe_many([result.latency for result in results], source='outbox')
+    sent_at = timezone.now()
+    for notification, result in zip(notifications, results):
+        notification.attempts += 1
+        notification.claimed_until = None
+        if result.ok:
+            notification.status = Notification.STATUS_SENT
+            notification.sent_at = sent_at
+            notification.error = ''
+        else:
+            notification.error = result.error
+            if notification.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                notification.status = Notification.STATUS_FAILED
+    # Результаты пишутся второй короткой транзакцией (bulk_update атомарен)
+    Notification.objects.bulk_update(notifications, ['status', 'attempts', 'error', 'sent_at', 'claimed_until'])
+
+    # Пачка заполнена целиком — вероятно, в outbox есть ещё сообщения
+    if len(notifications) == settings.OUTBOX_BATCH_SIZE:
+        enqueue_outbox_drain()
+    return len(notifications)
+
+
+def enqueue_updates_apply():
+    # Небольшая задержка собирает всплеск нажатий в одну пачку
+    try:
+        apply_telegram_updates.apply_async(countdown=settings.TELEGRAM_UPDATES_BATCH_DELAY,
+                                           retry_policy=ENQUEUE_RETRY_POLICY)
+    except Exception as exc:
+        logger.warning('Не удалось поставить разбор нажатий Telegram в очередь: %s', exc)
+
+
+@shared_task(ignore_result=True, soft_time_limit=settings.REMINDER_TASK_TIME_LIMIT)
+@TASK_DURATION.time(task='apply_telegram_updates')
+def apply_telegram_updates():
+    # Нажатия, пришедшие после этой строки, поставят следующую задачу
+    cache.delete(UPDATES_SCHEDULED_KEY)
+    queue = get_queue()
+    totals = Counter({'completed': 0, 'snoozed': 0, 'rejected': 0})
+    while True:
+        items = queue.pop(settings.TELEGRAM_UPDATES_BATCH_SIZE)
+        if not items:
+            break
+        try:
+            counts = apply_updates(items)
+        except Exception:
+            # Пачка возвращается в очередь и будет разобрана следующим запуском
+            queue.push(items)
+            raise
+        totals.update(counts)
+        for result, count in counts.items():
+            TELEGRAM_CALLBACKS.inc(count, result=result)
+        if len(items) < settings.TELEGRAM_UPDATES_BATCH_SIZE:
+            break
+    return dict(totals)
+
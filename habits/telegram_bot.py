@@ -1,14 +1,79 @@
-import requests
 from django.conf import settings
 
+from .delivery import Message, send_many
+
+DIGEST_HEADER = "Напоминание: пора выполнить привычки:"
+
+# callback_data кнопок: "done:<habit_id>" и "snooze:<habit_id>" (Telegram допускает до 64 байт)
+CALLBACK_DONE = 'done'
+CALLBACK_SNOOZE = 'snooze'
+MAX_KEYBOARD_ROWS = 50  # по две кнопки в строке
+
+
+def reminder_text(habit_name):
+    return f"Напоминание: Пора выполнить привычку '{habit_name}'!"
+
 
 def send_reminder(chat_id, habit_name):
-    url = f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
-    message = f"Напоминание: Пора выполнить привычку '{habit_name}'!"
-    payload = {
-        'chat_id': chat_id,
-        'text': message
-    }
-    requests.post(url, data=payload)
+    # Одиночная отправка через тот же движок, возвращает DeliveryResult
+    return send_many([Message(chat_id, reminder_text(habit_name))])[0]
+
+
+def reminder_keyboard(habits):
+    # Строка кнопок на каждую привычку; в сводке к кнопке добавляется название привычки
+    single = len(habits) == 1
+    rows = []
+    for habit in habits:
+        suffix = '' if single else f' {habit.action}'[:40]
+        rows.append([
+            {'text': f'✅ Выполнено{suffix}', 'callback_data': f'{CALLBACK_DONE}:{habit.id}'},
+            {'text': f'⏰ {settings.TELEGRAM_SNOOZE_MINUTES} мин', 'callback_data': f'{CALLBACK_SNOOZE}:{habit.id}'},
+        ])
+    return {'inline_keyboard': rows}
+
+
+def parse_callback_data(data):
+    # "done:12" -> ("done", 12); чужие и испорченные данные -> None
+    action, _, habit_id = (data or '').partition(':')
+    if action not in (CALLBACK_DONE, CALLBACK_SNOOZE) or not habit_id.isdigit():
+        return None
+    return action, int(habit_id)
+
+
+def _digest_line(habit):
+    return f"• {habit.action} ({habit.time:%H:%M}, {habit.place})"
+
+
+def _digest(chat_id, lines, habits):
+    return Message(chat_id, '\n'.join(lines), [habit.id for habit in habits], reminder_keyboard(habits))
+
+
+def build_digests(habits, max_length=None):
+    """
+    Собирает наступившие привычки в одно сообщение на чат (habit.user.telegram_chat_id).
+    Если текст длиннее `max_length`, сводка делится на несколько сообщений.
+    """
+    max_length = max_length or settings.TELEGRAM_MAX_MESSAGE_LENGTH
+    by_chat = {}
+    for habit in habits:
+        by_chat.setdefault(habit.user.telegram_chat_id, []).append(habit)
 
+    messages = []
+    for chat_id, chat_habits in by_chat.items():
+        if len(chat_habits) == 1:
+            habit = chat_habits[0]
+            messages.append(Message(chat_id, reminder_text(habit.action), [habit.id], reminder_keyboard([habit])))
+            continue
 
+        lines, batch, length = [DIGEST_HEADER], [], len(DIGEST_HEADER)
+        for habit in sorted(chat_habits, key=lambda h: (h.time, h.id)):
+            line = _digest_line(habit)[:max_length - len(DIGEST_HEADER) - 1]
+            # Длина текста и число кнопок (у Telegram не больше 100 на сообщение)
+            if batch and (length + 1 + len(line) > max_length or len(batch) >= MAX_KEYBOARD_ROWS):
+                messages.append(_digest(chat_id, lines, batch))
+                lines, batch, length = [DIGEST_HEADER], [], len(DIGEST_HEADER)
+            lines.append(line)
+            batch.append(habit)
+            length += 1 + len(line)
+        messages.append(_digest(chat_id, lines, batch))
+    return messages
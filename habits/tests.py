@@ -1,13 +1,45 @@
-from datetime import time
-from django.test import TestCase
+import asyncio
+import io
+import json
+import tempfile
+import time as time_module
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.utils import timezone
 from rest_framework.test import APIClient, APITestCase
 from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
 from django.core.exceptions import ValidationError
 from unittest.mock import patch
-from .models import Habit
-from .tasks import send_habit_reminders
+from celery import current_app, group
+from celery.exceptions import SoftTimeLimitExceeded
+from config.replicas import PIN_COOKIE, PrimaryReplicaRouter, _state as _replica_state, reset_pinning, use_primary
+from config.metrics import REGISTRY, REQUEST_DB_QUERIES, BufferedHistogram, Histogram
+from config.schema import clear_loaded_schema, render_schema
+from config.throttling import clear_local_blocks
+from .metrics import (DELIVERIES, HABITS_SELECTED, LAST_TICK, SCHEDULE_LAG, TASK_DURATION,
+                      TELEGRAM_LATENCY)
+from .models import Habit, HabitCompletion, HabitStats, Notification, ReminderDelivery
+from .stats import local_today, record_completion, record_completions
+from .tasks import (apply_telegram_updates, chunk_by_user, drain_notification_outbox, retry_reminder_deliveries,
+                    send_habit_reminders, send_reminder_chunk)
+from .resilience import CircuitBreaker, backoff_delay, telegram_breaker
+from .locks import acquire_lock, release_lock
+from .benchmarks import ApiBenchmark
+from .importer import import_habits
 from .validators import validate_related_habit, validate_habit_time, validate_habit_frequency
+from .scheduling import advance_reminder, next_occurrence
+from .delivery import DeliveryResult, Message, TelegramDelivery, send_many
+from .fake_telegram import FakeTelegramServer
+from .telegram_bot import build_digests, parse_callback_data
+from .updates import apply_updates, get_queue
+from zoneinfo import ZoneInfo
 
 
 class HabitModelTestCase(TestCase):
@@ -159,3 +191,1109 @@ class ValidatorsTestCase(TestCase):
             pass
 
 
+class ReminderScheduleTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='testuser', password='testpass', telegram_chat_id='123456', timezone='Europe/Moscow')
+
+    def test_next_occurrence_uses_user_timezone(self):
+        after = datetime(2025, 1, 10, 4, 0, tzinfo=dt_timezone.utc)  # 07:00 по Москве
+        slot = next_occurrence(time(8, 10), ZoneInfo('Europe/Moscow'), after)
+        self.assertEqual(slot, datetime(2025, 1, 10, 5, 10, tzinfo=dt_timezone.utc))
+
+        slot = next_occurrence(time(6, 10), ZoneInfo('Europe/Moscow'), after)
+        self.assertEqual(slot, datetime(2025, 1, 11, 3, 10, tzinfo=dt_timezone.utc))
+
+    def test_save_sets_next_reminder_at(self):
+        habit = Habit.objects.create(user=self.user, action='Зарядка', place='Дом', time=time(8, 10),
+                                     duration=60, reward='Кофе')
+        self.assertIsNotNone(habit.next_reminder_at)
+        self.assertEqual(habit.next_reminder_at.astimezone(ZoneInfo('Europe/Moscow')).time(), time(8, 10))
+
+    def test_timezone_change_reschedules_reminders(self):
+        habit = Habit.objects.create(user=self.user, action='Зарядка', place='Дом', time=time(8, 10),
+                                     duration=60, reward='Кофе')
+        user = get_user_model().objects.get(pk=self.user.pk)
+        user.timezone = 'Asia/Yekaterinburg'
+        with self.assertNumQueries(3):  # сохранение пользователя, выборка и bulk_update привычек
+            user.save(update_fields=['timezone'])
+        habit.refresh_from_db()
+        self.assertEqual(habit.next_reminder_at.astimezone(ZoneInfo('Asia/Yekaterinburg')).time(), time(8, 10))
+
+        user.first_name = 'Иван'
+        with self.assertNumQueries(1):  # часовой пояс не менялся — привычки не трогаем
+            user.save()
+
+    def test_advance_reminder_respects_frequency(self):
+        habit = Habit(user=self.user, time=time(8, 10), frequency=3)
+        slot = datetime(2025, 1, 10, 5, 10, tzinfo=dt_timezone.utc)
+        self.assertEqual(advance_reminder(habit, slot, now=slot), slot + timedelta(days=3))
+        # Пропущенные слоты не отправляются задним числом
+        now = slot + timedelta(days=7)
+        self.assertEqual(advance_reminder(habit, slot, now=now), slot + timedelta(days=9))
+
+    @patch('habits.tasks.send_many')
+    def test_only_due_habits_are_sent(self, mock_send_many):
+        current_app.conf.task_always_eager = True
+        self.addCleanup(setattr, current_app.conf, 'task_always_eager', False)
+        mock_send_many.side_effect = lambda messages: [DeliveryResult(m, ok=True) for m in messages]
+        due = Habit.objects.create(user=self.user, action='Зарядка', place='Дом', time=time(8, 10),
+                                   duration=60, reward='Кофе')
+        later = Habit.objects.create(user=self.user, action='Чтение', place='Дом', time=time(9, 10),
+                                     duration=60, reward='Чай')
+        now = timezone.now()
+        Habit.objects.filter(pk=due.pk).update(next_reminder_at=now - timedelta(seconds=30))
+        Habit.objects.filter(pk=later.pk).update(next_reminder_at=now + timedelta(hours=1))
+
+        send_habit_reminders()
+
+        messages = mock_send_many.call_args.args[0]
+        self.assertEqual([(m.chat_id, m.text) for m in messages],
+                         [('123456', "Напоминание: Пора выполнить привычку 'Зарядка'!")])
+        due.refresh_from_db()
+        self.assertGreater(due.next_reminder_at, now)
+
+
+class ReminderFanOutTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_chunk_by_user_keeps_user_habits_together(self):
+        rows = [(1, 10), (2, 10), (3, 11), (4, 12), (5, 12), (6, 12), (7, 13)]
+        self.assertEqual(list(chunk_by_user(rows, 2)), [[1, 2], [3, 4, 5, 6], [7]])
+
+    @patch('habits.tasks.send_many')
+    def test_chunk_reports_counts(self, mock_send_many):
+        mock_send_many.side_effect = lambda messages: [
+            DeliveryResult(m, ok=m.chat_id == '123456') for m in messages]
+        user = get_user_model().objects.create_user(username='testuser', password='testpass',
+                                                    telegram_chat_id='123456')
+        other_user = get_user_model().objects.create_user(username='otheruser', password='testpass',
+                                                          telegram_chat_id='654321')
+        ok = Habit.objects.create(user=user, action='Зарядка', place='Дом', time=time(8, 10),
+                                  duration=60, reward='Кофе')
+        failed = Habit.objects.create(user=other_user, action='Чтение', place='Дом', time=time(9, 10),
+                                      duration=60, reward='Чай')
+        not_due = Habit.objects.create(user=user, action='Сон', place='Дом', time=time(22, 10),
+                                       duration=60, reward='Чай')
+        now = timezone.now()
+        Habit.objects.filter(pk__in=[ok.pk, failed.pk]).update(next_reminder_at=now)
+        Habit.objects.filter(pk=not_due.pk).update(next_reminder_at=now + timedelta(hours=1))
+
+        counts = send_reminder_chunk([ok.pk, failed.pk, not_due.pk], now.isoformat())
+
+        self.assertEqual(counts, {'sent': 1, 'failed': 1, 'held': 0, 'dead': 0, 'skipped': 1, 'messages': 2})
+        self.assertEqual(ReminderDelivery.objects.get(habit=ok).status, ReminderDelivery.STATUS_SENT)
+        self.assertEqual(ReminderDelivery.objects.get(habit=failed).status, ReminderDelivery.STATUS_FAILED)
+
+    @patch('habits.tasks.send_many')
+    def test_slot_is_claimed_once(self, mock_send_many):
+        mock_send_many.side_effect = lambda messages: [DeliveryResult(m, ok=True) for m in messages]
+        user = get_user_model().objects.create_user(username='testuser', password='testpass',
+                                                    telegram_chat_id='123456')
+        habit = Habit.objects.create(user=user, action='Зарядка', place='Дом', time=time(8, 10),
+                                     duration=60, reward='Кофе')
+        slot = timezone.now()
+        Habit.objects.filter(pk=habit.pk).update(next_reminder_at=slot)
+        self.assertEqual(send_reminder_chunk([habit.pk], slot.isoformat())['sent'], 1)
+
+        # Перекрывающийся запуск видит привычку со старым слотом, но слот уже занят
+        Habit.objects.filter(pk=habit.pk).update(next_reminder_at=slot)
+        counts = send_reminder_chunk([habit.pk], slot.isoformat())
+
+        self.assertEqual(counts, {'sent': 0, 'failed': 0, 'held': 0, 'dead': 0, 'skipped': 1, 'messages': 0})
+        self.assertEqual(mock_send_many.call_args.args[0], [])
+        self.assertEqual(ReminderDelivery.objects.filter(habit=habit).count(), 1)
+
+
+class DigestTestCase(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass',
+                                                         telegram_chat_id='123456')
+
+    def make_habits(self, count):
+        return [Habit.objects.create(user=self.user, action=f'Привычка {i}', place='Дом', time=time(8, 10 + i),
+                                     duration=60, reward='Кофе') for i in range(count)]
+
+    def test_one_message_per_chat(self):
+        habits = self.make_habits(3)
+        messages = build_digests(habits)
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(messages[0].chat_id, '123456')
+        self.assertEqual(messages[0].habit_ids, [habit.id for habit in habits])
+        self.assertIn('• Привычка 2 (08:12, Дом)', messages[0].text)
+
+    def test_single_habit_keeps_plain_reminder(self):
+        habit = self.make_habits(1)[0]
+        self.assertEqual(build_digests([habit])[0].text, "Напоминание: Пора выполнить привычку 'Привычка 0'!")
+
+    def test_long_digest_is_split(self):
+        habits = self.make_habits(10)
+        messages = build_digests(habits, max_length=120)
+        self.assertGreater(len(messages), 1)
+        self.assertTrue(all(len(message.text) <= 120 for message in messages))
+        self.assertEqual(sum((message.habit_ids for message in messages), []), [habit.id for habit in habits])
+
+
+class DeliveryTestCase(TestCase):
+    def test_send_many_against_fake_server(self):
+        with FakeTelegramServer() as server:
+            messages = [Message(str(i % 3), f'Сообщение {i}') for i in range(12)]
+            results = send_many(messages, token='test', base_url=server.url, per_chat_rate=1000)
+
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual([result.message for result in results], messages)
+        self.assertEqual(len(server.requests), 12)
+        self.assertEqual(server.requests[0][0], 'sendMessage')
+
+    def test_failed_messages_are_reported(self):
+        with FakeTelegramServer(fail_rate=1.0, fail_status=429) as server:
+            results = send_many([Message('1', 'Текст')], token='test', base_url=server.url)
+
+        self.assertFalse(results[0].ok)
+        self.assertEqual(results[0].status_code, 429)
+        self.assertEqual(results[0].retry_after, 1)
+
+    @override_settings(TELEGRAM_RATE_LIMIT=30, TELEGRAM_SENDER_PROCESSES=3)
+    def test_bot_rate_is_split_between_sender_processes(self):
+        self.assertEqual(TelegramDelivery().rate, 10)
+        self.assertEqual(TelegramDelivery(rate=30).rate, 30)
+
+    def test_per_chat_rate_limit(self):
+        delivery = TelegramDelivery(token='test', base_url='http://127.0.0.1:9', rate=1000, per_chat_rate=20)
+        with FakeTelegramServer() as server:
+            delivery.base_url = server.url
+            started = time_module.monotonic()
+            asyncio.run(delivery.send_many([Message('1', 'Текст')] * 5))
+            elapsed = time_module.monotonic() - started
+        # Первое сообщение уходит сразу, остальные четыре — не чаще 20 в секунду
+        self.assertGreaterEqual(elapsed, 4 / 20 - 0.01)
+
+
+class NotificationOutboxTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass',
+                                                         telegram_chat_id='123456')
+        self.client.force_authenticate(user=self.user)
+        self.habit_data = {'place': 'Дом', 'time': '08:10:00', 'action': 'Зарядка', 'duration': 60,
+                           'reward': 'Кофе'}
+
+    @patch('habits.tasks.send_many')
+    @patch('habits.tasks.drain_notification_outbox.apply_async')
+    def test_create_writes_outbox_instead_of_calling_telegram(self, mock_apply_async, mock_send_many):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/habits/habits/', self.habit_data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        mock_send_many.assert_not_called()
+        mock_apply_async.assert_called_once()
+        notification = Notification.objects.get()
+        self.assertEqual(notification.chat_id, '123456')
+        self.assertEqual(notification.status, Notification.STATUS_PENDING)
+
+    @patch('habits.tasks.send_many')
+    def test_drain_marks_notifications(self, mock_send_many):
+        mock_send_many.side_effect = lambda messages: [DeliveryResult(m, ok=True) for m in messages]
+        habit = Habit.objects.create(user=self.user, action='Зарядка', place='Дом', time=time(8, 10),
+                                     duration=60, reward='Кофе')
+        Notification.objects.create(habit=habit, chat_id='123456', text='Текст')
+
+        self.assertEqual(drain_notification_outbox(), 1)
+        notification = Notification.objects.get()
+        self.assertEqual(notification.status, Notification.STATUS_SENT)
+        self.assertEqual(notification.attempts, 1)
+        self.assertEqual(drain_notification_outbox(), 0)
+
+    @patch('habits.tasks.send_many')
+    def test_drain_sends_outside_transaction_and_reclaims_expired_lease(self, mock_send_many):
+        savepoints = []
+
+        def send(messages):
+            savepoints.append(len(transaction.get_connection().savepoint_ids))
+            return [DeliveryResult(m, ok=True) for m in messages]
+        mock_send_many.side_effect = send
+        habit = Habit.objects.create(user=self.user, action='Зарядка', place='Дом', time=time(8, 10),
+                                     duration=60, reward='Кофе')
+        leased = Notification.objects.create(habit=habit, chat_id='123456', text='Занято',
+                                             claimed_until=timezone.now() + timedelta(minutes=1))
+        expired = Notification.objects.create(habit=habit, chat_id='123456', text='Воркер упал',
+                                              claimed_until=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(drain_notification_outbox(), 1)
+        # Тест сам идёт в транзакции: отправка вне транзакции задачи не добавляет точки сохранения
+        self.assertEqual(savepoints, [len(transaction.get_connection().savepoint_ids)])
+        expired.refresh_from_db()
+        leased.refresh_from_db()
+        self.assertEqual((expired.status, expired.claimed_until), (Notification.STATUS_SENT, None))
+        self.assertEqual(leased.status, Notification.STATUS_PENDING)
+
+
+class DeliveryRetryTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass',
+                                                         telegram_chat_id='123456')
+        self.habit = Habit.objects.create(user=self.user, action='Зарядка', place='Дом', time=time(8, 10),
+                                          duration=60, reward='Кофе')
+        self.slot = timezone.now() - timedelta(minutes=1)
+        Habit.objects.filter(pk=self.habit.pk).update(next_reminder_at=self.slot)
+
+    @override_settings(REMINDER_RETRY_BASE_DELAY=10, REMINDER_RETRY_MAX_DELAY=100)
+    def test_backoff_grows_and_respects_retry_after(self):
+        self.assertLessEqual(backoff_delay(1), 10)
+        self.assertLessEqual(backoff_delay(10), 100)
+        self.assertGreaterEqual(backoff_delay(1, retry_after=30), 30)
+
+    @override_settings(REMINDER_MAX_ATTEMPTS=2)
+    @patch('habits.tasks.send_many')
+    def test_failed_delivery_is_retried_then_dead_lettered(self, mock_send_many):
+        mock_send_many.side_effect = lambda messages: [DeliveryResult(m, ok=False, error='boom') for m in messages]
+        send_reminder_chunk([self.habit.pk], timezone.now().isoformat())
+        delivery = ReminderDelivery.objects.get(habit=self.habit)
+        self.assertEqual(delivery.status, ReminderDelivery.STATUS_FAILED)
+        self.assertGreater(delivery.next_attempt_at, timezone.now())
+
+        ReminderDelivery.objects.filter(pk=delivery.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(retry_reminder_deliveries()['dead'], 1)
+        delivery.refresh_from_db()
+        self.assertEqual(delivery.status, ReminderDelivery.STATUS_DEAD)
+        self.assertEqual(delivery.attempts, 2)
+
+    @patch('habits.tasks.send_many')
+    def test_abandoned_claim_is_retried_after_lease(self, mock_send_many):
+        mock_send_many.side_effect = SoftTimeLimitExceeded()
+        with self.assertRaises(SoftTimeLimitExceeded):
+            send_reminder_chunk([self.habit.pk], timezone.now().isoformat())
+        delivery = ReminderDelivery.objects.get(habit=self.habit)
+        self.assertEqual(delivery.status, ReminderDelivery.STATUS_CLAIMED)
+        mock_send_many.side_effect = lambda messages: [DeliveryResult(m, ok=True) for m in messages]
+        # Пока аренда не истекла, строку не трогают
+        self.assertEqual(retry_reminder_deliveries()['messages'], 0)
+
+        ReminderDelivery.objects.filter(pk=delivery.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(retry_reminder_deliveries()['sent'], 1)
+        delivery.refresh_from_db()
+        self.assertEqual(delivery.status, ReminderDelivery.STATUS_SENT)
+
+    @patch('habits.tasks.send_many')
+    def test_open_breaker_holds_messages(self, mock_send_many):
+        telegram_breaker.trip()
+        counts = send_reminder_chunk([self.habit.pk], timezone.now().isoformat())
+
+        self.assertEqual(counts['held'], 1)
+        mock_send_many.assert_not_called()
+        delivery = ReminderDelivery.objects.get(habit=self.habit)
+        self.assertEqual(delivery.status, ReminderDelivery.STATUS_HELD)
+        self.assertEqual(delivery.attempts, 0)
+
+    def test_breaker_trips_on_error_rate(self):
+        breaker = CircuitBreaker('test', threshold=0.5, min_requests=10, window=60, cooldown=60)
+        breaker.record(successes=5, failures=4)
+        self.assertFalse(breaker.is_open())
+        breaker.record(successes=0, failures=2)
+        self.assertTrue(breaker.is_open())
+
+
+class ReminderCoordinatorTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        current_app.conf.task_always_eager = True
+        self.addCleanup(setattr, current_app.conf, 'task_always_eager', False)
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass',
+                                                         telegram_chat_id='123456')
+
+    def test_lock_is_exclusive(self):
+        token = acquire_lock('test', 60)
+        self.assertIsNotNone(token)
+        self.assertIsNone(acquire_lock('test', 60))
+        release_lock('test', 'чужой токен')
+        self.assertIsNone(acquire_lock('test', 60))
+        release_lock('test', token)
+        self.assertIsNotNone(acquire_lock('test', 60))
+
+    @patch('habits.tasks.send_many')
+    def test_overlapping_run_is_skipped(self, mock_send_many):
+        habit = Habit.objects.create(user=self.user, action='Зарядка', place='Дом', time=time(8, 10),
+                                     duration=60, reward='Кофе')
+        Habit.objects.filter(pk=habit.pk).update(next_reminder_at=timezone.now())
+        acquire_lock('send_habit_reminders', 60)
+
+        self.assertEqual(send_habit_reminders(), 0)
+        mock_send_many.assert_not_called()
+
+    @patch('habits.tasks.chord')
+    def test_failed_chunk_releases_lock(self, mock_chord):
+        habit = Habit.objects.create(user=self.user, action='Зарядка', place='Дом', time=time(8, 10),
+                                     duration=60, reward='Кофе')
+        Habit.objects.filter(pk=habit.pk).update(next_reminder_at=timezone.now())
+        self.assertEqual(send_habit_reminders(), 1)
+        self.assertIsNone(acquire_lock('send_habit_reminders', 60))
+
+        # Пачка упала: Celery не запускает callback chord, а вызывает его обработчики ошибок с id задачи
+        callback = mock_chord.return_value.call_args.args[0]
+        group(callback.options['link_error']).apply(('failed-chunk-id',))
+        self.assertIsNotNone(acquire_lock('send_habit_reminders', 60))
+
+    @override_settings(REMINDER_MAX_PER_TICK=2)
+    @patch('habits.tasks.send_many')
+    def test_backlog_is_caught_up_oldest_first(self, mock_send_many):
+        mock_send_many.side_effect = lambda messages: [DeliveryResult(m, ok=True) for m in messages]
+        now = timezone.now()
+        habits = []
+        for i in range(3):
+            habit = Habit.objects.create(user=self.user, action=f'Привычка {i}', place='Дом', time=time(8, 10),
+                                         duration=60, reward='Кофе')
+            Habit.objects.filter(pk=habit.pk).update(next_reminder_at=now - timedelta(hours=3 - i))
+            habits.append(habit)
+
+        send_habit_reminders()
+        self.assertEqual(set(ReminderDelivery.objects.values_list('habit_id', flat=True)),
+                         {habits[0].pk, habits[1].pk})
+
+        send_habit_reminders()
+        self.assertEqual(ReminderDelivery.objects.count(), 3)
+
+
+class PublicHabitCacheTestCase(APITestCase):
+    url = '/api/habits/public-habits/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass')
+        self.habit = Habit.objects.create(user=self.user, action='Зарядка', place='Дом', time=time(8, 10),
+                                          duration=60, reward='Кофе', is_public=True)
+
+    def test_cached_page_skips_database(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertIn('public', first['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_changes_to_public_habits_invalidate_cache(self):
+        etag = self.client.get(self.url)['ETag']
+        Habit.objects.create(user=self.user, action='Чтение', place='Дом', time=time(9, 10),
+                             duration=60, reward='Чай', is_public=True)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+
+        self.habit.is_public = False
+        self.habit.save()
+        self.assertEqual(self.client.get(self.url).data['count'], 1)
+
+    def test_private_changes_keep_cache(self):
+        etag = self.client.get(self.url)['ETag']
+        Habit.objects.create(user=self.user, action='Сон', place='Дом', time=time(22, 10),
+                             duration=60, reward='Чай')
+        self.assertEqual(self.client.get(self.url)['ETag'], etag)
+
+
+class KeysetPaginationTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        # Несколько привычек с одинаковым временем, чтобы проверить порядок по id
+        self.habits = [
+            Habit.objects.create(user=self.user, action=f'Привычка {i}', place='Дом', time=time(8, 10 + i // 3),
+                                 duration=60, reward='Кофе', is_public=True)
+            for i in range(7)
+        ]
+
+    def walk(self, url):
+        ids, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            ids += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+            pages += 1
+        return ids, pages
+
+    def test_cursor_walks_all_habits_in_order(self):
+        expected = [habit.id for habit in sorted(self.habits, key=lambda h: (h.time, h.id))]
+        self.assertEqual(self.walk('/api/habits/habits/?cursor=&page_size=3'), (expected, 3))
+        self.assertEqual(self.walk('/api/habits/public-habits/?cursor=&page_size=2'), (expected, 4))
+
+    def test_page_without_count_query(self):
+        first = self.client.get('/api/habits/habits/?cursor=&page_size=3')
+        with self.assertNumQueries(1):
+            self.client.get(first.data['next'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/habits/habits/?cursor=мусор')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_number_mode_is_default(self):
+        response = self.client.get('/api/habits/habits/')
+        self.assertEqual(response.data['count'], 7)
+
+
+class BulkHabitTestCase(APITestCase):
+    url = '/api/habits/habits/bulk/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        self.pleasant = Habit.objects.create(user=self.user, action='Ванна', place='Дом', time=time(21, 10),
+                                             duration=60, is_pleasant=True)
+
+    def item(self, **kwargs):
+        data = {'place': 'Дом', 'time': '08:10:00', 'action': 'Зарядка', 'duration': 60, 'reward': 'Кофе'}
+        data.update(kwargs)
+        return data
+
+    def test_bulk_create_resolves_related_habits_in_one_query(self):
+        items = [self.item(action=f'Привычка {i}', reward='', related_habit=self.pleasant.id) for i in range(10)]
+        # related_habit одним запросом, затем транзакция и bulk_create
+        with self.assertNumQueries(4):
+            response = self.client.post(self.url, items, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertEqual(Habit.objects.filter(related_habit=self.pleasant).count(), 10)
+        self.assertTrue(all(h.next_reminder_at for h in Habit.objects.exclude(pk=self.pleasant.pk)))
+
+    def test_bulk_create_reports_item_errors_and_saves_nothing(self):
+        items = [self.item(), self.item(duration=500), self.item(reward='', related_habit=999999)]
+        response = self.client.post(self.url, items, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+        self.assertEqual(Habit.objects.count(), 1)
+
+    def test_bulk_partial_update_keeps_stored_related_habit(self):
+        habit = Habit.objects.create(user=self.user, action='Зарядка', place='Дом', time=time(8, 10), duration=60,
+                                     related_habit=self.pleasant)
+        response = self.client.patch(self.url, [{'id': habit.id, 'place': 'Парк'}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        habit.refresh_from_db()
+        self.assertEqual((habit.place, habit.related_habit_id), ('Парк', self.pleasant.id))
+
+    def test_bulk_update_and_delete(self):
+        habits = [Habit.objects.create(user=self.user, action=f'Привычка {i}', place='Дом', time=time(8, 10),
+                                       duration=60, reward='Кофе') for i in range(3)]
+        response = self.client.patch(self.url, [{'id': habit.id, 'duration': 90} for habit in habits],
+                                     format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Habit.objects.filter(duration=90).count(), 3)
+
+        response = self.client.delete(self.url, [habit.id for habit in habits], format='json')
+        self.assertEqual(response.data, {'deleted': 3})
+        self.assertEqual(Habit.objects.count(), 1)
+
+    def test_cannot_touch_other_users_habits(self):
+        other = get_user_model().objects.create_user(username='otheruser', password='testpass')
+        habit = Habit.objects.create(user=other, action='Чужая', place='Дом', time=time(8, 10),
+                                     duration=60, reward='Кофе')
+        response = self.client.patch(self.url, [{'id': habit.id, 'duration': 90}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.delete(self.url, [habit.id], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(Habit.objects.filter(pk=habit.pk).exists())
+
+
+class QueryBudgetTestCase(TestCase):
+    # Регрессии N+1: число запросов на каждое действие API и рассылку не должно расти
+    def test_query_budgets(self):
+        cache.clear()
+        benchmark = ApiBenchmark(users=3, habits=5, iterations=2)
+        for budget in benchmark.budgets.values():
+            budget.pop('p50_ms', None)
+        report = benchmark.run()
+        violations = {result['name']: result['violations'] for result in report['results'] if result['violations']}
+        self.assertEqual(violations, {})
+        self.assertTrue(report['passed'])
+
+
+class ExportTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass')
+        other = get_user_model().objects.create_user(username='otheruser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        for i, owner in enumerate([self.user, self.user, other]):
+            Habit.objects.create(user=owner, action=f'Привычка {i}', place='Дом', time=time(8, 10 + i),
+                                 duration=60, reward='Кофе', is_public=i != 1)
+
+    def read(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson_export_of_own_habits(self):
+        response = self.client.get('/api/habits/habits/export/')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([row['action'] for row in rows], ['Привычка 0', 'Привычка 1'])
+        self.assertEqual(rows[0]['time'], '08:10:00')
+
+    def test_csv_export_of_public_habits(self):
+        self.client.logout()
+        lines = self.read(self.client.get('/api/habits/public-habits/export/?output=csv')).splitlines()
+        self.assertEqual(lines[0], 'id,place,time,action,duration')
+        self.assertEqual(len(lines), 3)
+
+    def test_unknown_format(self):
+        response = self.client.get('/api/habits/habits/export/?output=xml')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ImportTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+
+    def test_csv_with_forward_reference(self):
+        data = ('ref,place,time,action,duration,reward,is_pleasant,related_ref,is_public\n'
+                'run,Парк,08:10:00,Пробежка,60,,,bath,true\n'
+                'bad,Дом,08:01:00,Неверное время,60,Кофе,,,\n'
+                'bath,Дом,09:10:00,Ванна,60,,true,,\n'
+                'orphan,Дом,08:10:00,Зарядка,60,,,bad,\n')
+        result = import_habits(self.user, io.BytesIO(data.encode()), 'csv', batch_size=1)
+        self.assertEqual((result.created, result.failed), (2, 2))
+        self.assertEqual([error['line'] for error in result.errors], [3, 5])
+        run = Habit.objects.get(action='Пробежка')
+        self.assertEqual(run.related_habit.action, 'Ванна')
+        self.assertIsNotNone(run.next_reminder_at)
+
+    def test_unresolved_reference(self):
+        data = '{"place": "Дом", "time": "08:10:00", "action": "Зарядка", "duration": 60, "related_ref": "x"}\nnot json\n'
+        result = import_habits(self.user, io.BytesIO(data.encode()), 'ndjson')
+        self.assertEqual((result.created, result.failed), (0, 2))
+
+    def test_import_endpoint(self):
+        data = '{"place": "Дом", "time": "08:10:00", "action": "Зарядка", "duration": 60, "reward": "Кофе"}\n'
+        upload = SimpleUploadedFile('habits.ndjson', data.encode())
+        response = self.client.post('/api/habits/habits/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(Habit.objects.filter(user=self.user).count(), 1)
+
+    def test_export_round_trip_with_command(self):
+        Habit.objects.create(user=self.user, place='Дом', time=time(8, 10), action='Зарядка', duration=60, reward='Кофе')
+        export = b''.join(self.client.get('/api/habits/habits/export/?output=csv').streaming_content)
+        with tempfile.NamedTemporaryFile(suffix='.csv') as f:
+            f.write(export)
+            f.flush()
+            call_command('import_habits', f.name, user='testuser', stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(Habit.objects.filter(user=self.user, action='Зарядка').count(), 2)
+
+
+@override_settings(METRICS_TOKEN='metrics-token')
+class PerformanceMiddlewareTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        Habit.objects.create(user=self.user, place='Дом', time=time(8, 10), action='Зарядка', duration=60,
+                             reward='Кофе')
+
+    def test_server_timing_and_metrics(self):
+        REQUEST_DB_QUERIES.clear()
+        response = self.client.get('/api/habits/habits/')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", serializer;dur=[\d.]+, total;dur=')
+        metrics = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer metrics-token').content.decode()
+        self.assertIn('http_request_db_queries_count{view="habit-list"} 1', metrics)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', metrics)
+
+    @override_settings(PERFORMANCE_SAMPLE_RATE=0)
+    def test_sampling_off(self):
+        response = self.client.get('/api/habits/habits/')
+        self.assertNotIn('Server-Timing', response)
+
+    def test_metrics_require_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code,
+                         status.HTTP_403_FORBIDDEN)
+        with override_settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(METRICS_FLUSH_INTERVAL=3600)
+    def test_request_histograms_are_shared_between_processes(self):
+        # Два экземпляра с одним именем — как одна метрика в двух воркерах веб-сервера
+        first, second = (BufferedHistogram('test_shared_seconds', 'Тест', ('view',)) for _ in range(2))
+        for histogram in (first, second):
+            self.addCleanup(REGISTRY.remove, histogram)
+        self.addCleanup(first.clear)
+        first.observe(0.2, view='x')
+        second.observe_many([0.3, 0.4], view='x')
+        # Буфер второго воркера ещё не сброшен в кэш
+        self.assertEqual(first.snapshot()[('x',)][-1], 1)
+        second.flush()
+        self.assertEqual(first.snapshot()[('x',)][-1], 3)
+        self.assertAlmostEqual(first.snapshot()[('x',)][-2], 0.9)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram('test_seconds', 'Тест', ('view',), buckets=(0.1, 1.0))
+        self.addCleanup(REGISTRY.remove, histogram)
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, view='x')
+        self.assertEqual(histogram.collect()[2:5], [
+            'test_seconds_bucket{view="x",le="0.1"} 1',
+            'test_seconds_bucket{view="x",le="1.0"} 2',
+            'test_seconds_bucket{view="x",le="+Inf"} 3',
+        ])
+
+
+class ReminderMetricsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        current_app.conf.task_always_eager = True
+        self.addCleanup(setattr, current_app.conf, 'task_always_eager', False)
+
+    @patch('habits.tasks.send_many')
+    def test_tick_records_pipeline_metrics(self, mock_send_many):
+        mock_send_many.side_effect = lambda messages: [
+            DeliveryResult(m, ok=m.chat_id == '123456', latency=0.2) for m in messages]
+        user = get_user_model().objects.create_user(username='testuser', password='testpass',
+                                                    telegram_chat_id='123456')
+        other_user = get_user_model().objects.create_user(username='otheruser', password='testpass',
+                                                          telegram_chat_id='654321')
+        Habit.objects.create(user=user, action='Зарядка', place='Дом', time=time(8, 10), duration=60, reward='Кофе')
+        Habit.objects.create(user=other_user, action='Чтение', place='Дом', time=time(9, 10), duration=60,
+                             reward='Чай')
+        Habit.objects.update(next_reminder_at=timezone.now() - timedelta(seconds=90))
+
+        send_habit_reminders()
+
+        self.assertEqual(HABITS_SELECTED.snapshot()[()][-1], 1)
+        self.assertEqual((DELIVERIES.value(result='sent'), DELIVERIES.value(result='failed')), (1, 1))
+        self.assertEqual(SCHEDULE_LAG.quantile(0.5), 90)  # середина корзины (60, 120]
+        self.assertAlmostEqual(TELEGRAM_LATENCY.snapshot()[('reminders',)][-2], 0.4)
+        self.assertEqual(TASK_DURATION.snapshot()[('tick',)][-1], 1)
+        self.assertIsNotNone(LAST_TICK.value())
+
+        with override_settings(METRICS_TOKEN='metrics-token'):
+            metrics = APIClient().get('/metrics', HTTP_AUTHORIZATION='Bearer metrics-token').content.decode()
+        self.assertIn('reminder_deliveries_total{result="sent"} 1', metrics)
+        self.assertIn('telegram_request_duration_seconds_count{source="reminders"} 2', metrics)
+
+
+class AsyncViewsTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass')
+        other = get_user_model().objects.create_user(username='otheruser', password='testpass')
+        self.token = f'Bearer {AccessToken.for_user(self.user)}'
+        self.habits = [
+            Habit.objects.create(user=owner, action=f'Привычка {i}', place='Дом', time=time(8, 10 + i), duration=60,
+                                 reward='Кофе', is_public=True)
+            for i, owner in enumerate([self.user] * 6 + [other])
+        ]
+
+    def test_habit_list_matches_sync_view(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        for query in ('', '?page=2', '?cursor='):
+            sync = self.client.get(f'/api/habits/habits/{query}').json()
+            response = self.client.get(f'/api/habits/async/habits/{query}')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            data = response.json()
+            self.assertEqual(data['results'], sync['results'])
+            self.assertEqual(set(data), set(sync))
+            self.assertEqual(data.get('count'), sync.get('count'))
+
+    def test_habit_detail_only_own(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        response = self.client.get(f'/api/habits/async/habits/{self.habits[0].id}/')
+        self.assertEqual(response.json()['action'], 'Привычка 0')
+        response = self.client.get(f'/api/habits/async/habits/{self.habits[-1].id}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_authentication_required(self):
+        response = self.client.get('/api/habits/async/habits/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('WWW-Authenticate', response)
+
+    def test_public_list_etag(self):
+        response = self.client.get('/api/habits/async/public-habits/?page_size=10')
+        self.assertEqual(response.json()['count'], 7)
+        response = self.client.get('/api/habits/async/public-habits/?page_size=10',
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    async def test_runs_under_asgi_handler(self):
+        response = await self.async_client.get('/api/habits/async/habits/', AUTHORIZATION=self.token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()['results']), 5)
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries"')
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class ReplicaRouterTestCase(TransactionTestCase):  # TestCase держит открытую транзакцию, а в ней чтения идут на default
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.addCleanup(_replica_state.reset, reset_pinning())
+
+    def test_reads_go_to_replicas_until_write(self):
+        self.assertIn(self.router.db_for_read(Habit), ['replica1', 'replica2'])
+        with use_primary():
+            self.assertEqual(self.router.db_for_read(Habit), 'default')
+        self.assertNotEqual(self.router.db_for_read(Habit), 'default')
+        self.assertEqual(self.router.db_for_write(Habit), 'default')
+        self.assertEqual(self.router.db_for_read(Habit), 'default')
+
+    def test_transaction_reads_primary(self):
+        with transaction.atomic():
+            self.assertEqual(self.router.db_for_read(Habit), 'default')
+
+    def test_no_migrations_on_replicas(self):
+        self.assertFalse(self.router.allow_migrate('replica1', 'habits'))
+        self.assertTrue(self.router.allow_migrate('default', 'habits'))
+
+
+@override_settings(DATABASE_REPLICAS=['default'])
+class ReminderChunkReplicaTestCase(TransactionTestCase):
+    @patch('habits.tasks.send_many')
+    def test_chunk_reads_habits_from_primary(self, mock_send_many):
+        mock_send_many.side_effect = lambda messages: [DeliveryResult(m, ok=True) for m in messages]
+        user = get_user_model().objects.create_user(username='testuser', password='testpass',
+                                                    telegram_chat_id='123456')
+        habit = Habit.objects.create(user=user, action='Зарядка', place='Дом', time=time(8, 10),
+                                     duration=60, reward='Кофе')
+        Habit.objects.filter(pk=habit.pk).update(next_reminder_at=timezone.now())
+        self.addCleanup(_replica_state.reset, reset_pinning())  # новая задача: ещё ничего не записала
+
+        # Реплику выбирает только чтение, не закреплённое за default
+        with patch('config.replicas.random.choice', side_effect=AssertionError('чтение с реплики')):
+            self.assertEqual(send_reminder_chunk([habit.pk], timezone.now().isoformat())['sent'], 1)
+
+
+@override_settings(DATABASE_REPLICAS=['default'])  # зеркало default: маршрутизация без второй базы
+class ReplicaPinningMiddlewareTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+
+    def test_write_sets_pin_cookie(self):
+        response = self.client.get('/api/habits/habits/')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        response = self.client.post('/api/habits/habits/', {
+            'place': 'Дом', 'time': '08:10:00', 'action': 'Зарядка', 'duration': 60, 'reward': 'Кофе',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], settings.REPLICA_PIN_SECONDS)
+
+
+class PublicHabitSearchTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass')
+        for action, place, is_public in [('Зарядка', 'Дом', True), ('Пробежка', 'Парк', True),
+                                         ('Зарядка перед сном', 'Дом', False)]:
+            Habit.objects.create(user=self.user, action=action, place=place, time=time(8, 10), duration=60,
+                                 reward='Кофе', is_public=is_public)
+
+    def search(self, query, url='/api/habits/public-habits/'):
+        response = self.client.get(url, {'search': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sorted(habit['action'] for habit in response.json()['results'])
+
+    def test_search_public_habits(self):
+        self.assertEqual(self.search('заряд'), ['Зарядка'])
+        self.assertEqual(self.search('парк'), ['Пробежка'])
+        self.assertEqual(self.search('"*'), [])  # синтаксис FTS5 в запросе не ломает поиск
+        self.assertEqual(self.search('парк', '/api/habits/async/public-habits/'), ['Пробежка'])
+
+    def test_index_follows_changes(self):
+        habit = Habit.objects.get(action='Пробежка')
+        habit.action = 'Велосипед'
+        habit.save()
+        self.assertEqual(self.search('пробеж'), [])
+        self.assertEqual(self.search('велос'), ['Велосипед'])
+        habit.delete()
+        self.assertEqual(self.search('велос'), [])
+
+    def test_admin_search(self):
+        admin_user = get_user_model().objects.create_superuser(username='admin', password='adminpass')
+        self.client.force_login(admin_user)
+        response = self.client.get('/admin/habits/habit/', {'q': 'сном'})
+        self.assertContains(response, 'Зарядка перед сном')
+        self.assertNotContains(response, 'Пробежка')
+
+
+class CompletionStatsTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        self.habit = Habit.objects.create(user=self.user, action='Зарядка', place='Дом', time=time(8, 10), duration=60,
+                                          reward='Кофе', frequency=2)
+        self.today = local_today(self.user)
+
+    def days_ago(self, days):
+        return self.today - timedelta(days=days)
+
+    def test_streaks_are_updated_incrementally(self):
+        for days in (10, 8, 6, 2, 0):  # разрыв 4 дня при frequency=2 обрывает серию
+            record_completion(self.habit, self.days_ago(days))
+        stats = HabitStats.objects.get(habit=self.habit)
+        self.assertEqual((stats.completions, stats.current_streak, stats.longest_streak), (5, 2, 3))
+
+        record_completion(self.habit, self.days_ago(4))  # задним числом соединяет серии
+        stats.refresh_from_db()
+        self.assertEqual((stats.completions, stats.current_streak, stats.longest_streak), (6, 6, 6))
+
+    def test_complete_endpoint(self):
+        url = f'/api/habits/habits/{self.habit.id}/complete/'
+        response = self.client.post(url, {'date': self.days_ago(2).isoformat()}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(url)
+        self.assertEqual(response.data['current_streak'], 2)
+        self.assertEqual(response.data['completion_rate'], 1.0)
+        self.assertEqual(self.client.post(url).status_code, status.HTTP_200_OK)  # повторная отметка за день
+        response = self.client.post(url, {'date': (self.today + timedelta(days=1)).isoformat()}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rate_counts_from_habit_creation(self):
+        # Привычка заведена 20 дней назад и выполнена один раз: ожидалось 11 выполнений при frequency=2
+        Habit.objects.filter(pk=self.habit.pk).update(created_at=timezone.now() - timedelta(days=20))
+        response = self.client.post(f'/api/habits/habits/{self.habit.id}/complete/')
+        self.assertEqual((response.data['expected'], response.data['completion_rate']), (11, 0.091))
+
+        other = Habit.objects.create(user=self.user, action='Чтение', place='Дом', time=time(9, 10), duration=60,
+                                     reward='Чай')
+        Habit.objects.filter(pk=other.pk).update(created_at=timezone.now() - timedelta(days=3))
+        other.refresh_from_db()
+        record_completions([(other, self.today)])
+        self.assertEqual(HabitStats.objects.get(habit=other).started_on, self.days_ago(3))
+
+    def test_stats_reads_do_not_scan_history(self):
+        for days in range(0, 40, 2):
+            record_completion(self.habit, self.days_ago(days))
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/habits/habits/{self.habit.id}/stats/')
+        self.assertEqual(response.data['current_streak'], 20)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/habits/habits/stats/')
+        self.assertEqual(response.data['completions'], 20)
+        self.assertEqual(len(response.data['habits']), 1)
+
+    def test_streak_expires_after_missed_period(self):
+        record_completion(self.habit, self.days_ago(5))
+        data = self.client.get(f'/api/habits/habits/{self.habit.id}/stats/').data
+        self.assertEqual((data['current_streak'], data['longest_streak']), (0, 1))
+
+
+@override_settings(TELEGRAM_WEBHOOK_SECRET='webhook-secret')
+class TelegramWebhookTestCase(TestCase):
+    url = '/api/habits/telegram/webhook/'
+
+    def setUp(self):
+        cache.clear()
+        get_queue().pop(10 ** 6)
+        current_app.conf.task_always_eager = True
+        self.addCleanup(setattr, current_app.conf, 'task_always_eager', False)
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass',
+                                                         telegram_chat_id='123456')
+        self.habit = Habit.objects.create(user=self.user, action='Зарядка', place='Дом', time=time(8, 10),
+                                          duration=60, reward='Кофе')
+
+    def callback(self, data, chat_id='123456', secret='webhook-secret'):
+        update = {'update_id': 1, 'callback_query': {
+            'id': 'cb1', 'from': {'id': int(chat_id)}, 'data': data,
+            'message': {'message_id': 5, 'chat': {'id': int(chat_id)}}}}
+        return self.client.post(self.url, json.dumps(update), content_type='application/json',
+                                HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN=secret)
+
+    def test_reminders_carry_buttons(self):
+        keyboard = build_digests([self.habit])[0].reply_markup['inline_keyboard']
+        self.assertEqual([parse_callback_data(button['callback_data']) for button in keyboard[0]],
+                         [('done', self.habit.id), ('snooze', self.habit.id)])
+        self.assertIsNone(parse_callback_data('done:abc'))
+
+    def test_secret_is_checked(self):
+        self.assertEqual(self.callback(f'done:{self.habit.id}', secret='wrong').status_code, 403)
+        with override_settings(TELEGRAM_WEBHOOK_SECRET=''):
+            self.assertEqual(self.callback(f'done:{self.habit.id}').status_code, 404)
+        self.assertFalse(HabitCompletion.objects.exists())
+
+    def test_done_answers_callback_and_records_completion(self):
+        response = self.callback(f'done:{self.habit.id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['method'], 'answerCallbackQuery')
+        completion = HabitCompletion.objects.get(habit=self.habit)
+        self.assertEqual(completion.source, HabitCompletion.SOURCE_TELEGRAM)
+        self.assertEqual(HabitStats.objects.get(habit=self.habit).current_streak, 1)
+
+    def test_snooze_moves_next_reminder(self):
+        self.callback(f'snooze:{self.habit.id}')
+        self.habit.refresh_from_db()
+        expected = timezone.now() + timedelta(minutes=settings.TELEGRAM_SNOOZE_MINUTES)
+        self.assertAlmostEqual(self.habit.next_reminder_at.timestamp(), expected.timestamp(), delta=5)
+
+    @patch('habits.tasks.send_many')
+    def test_snooze_across_midnight_keeps_regular_slot(self, mock_send_many):
+        mock_send_many.side_effect = lambda messages: [DeliveryResult(m, ok=True) for m in messages]
+        utc = dt_timezone.utc
+        regular = datetime(2030, 1, 2, 8, 10, tzinfo=utc)
+        Habit.objects.filter(pk=self.habit.pk).update(next_reminder_at=regular)
+        pressed_at = datetime(2030, 1, 1, 23, 55, tzinfo=utc)
+        apply_updates([{'action': 'snooze', 'habit': self.habit.id, 'chat': '123456', 'at': pressed_at.timestamp()}])
+        self.habit.refresh_from_db()
+        snoozed = pressed_at + timedelta(minutes=settings.TELEGRAM_SNOOZE_MINUTES)
+        self.assertEqual((self.habit.next_reminder_at, self.habit.regular_reminder_at), (snoozed, regular))
+
+        self.assertEqual(send_reminder_chunk([self.habit.pk], snoozed.isoformat())['sent'], 1)
+        # После отложенного напоминания 2 января в 00:10 следующее — регулярное 2 января в 8:10
+        self.habit.refresh_from_db()
+        self.assertEqual((self.habit.next_reminder_at, self.habit.regular_reminder_at), (regular, None))
+        self.assertEqual(send_reminder_chunk([self.habit.pk], regular.isoformat())['sent'], 1)
+        self.habit.refresh_from_db()
+        self.assertEqual(self.habit.next_reminder_at, regular + timedelta(days=1))
+
+    def test_burst_is_applied_in_one_batch(self):
+        habits = [self.habit] + [
+            Habit.objects.create(user=self.user, action=f'Привычка {i}', place='Дом', time=time(9, 10 + i),
+                                 duration=60, reward='Кофе') for i in range(20)]
+        cache.add('telegram:updates:scheduled', 1)  # задача уже поставлена — нажатия только копятся
+        for habit in habits:
+            self.callback(f'done:{habit.id}')
+        self.callback(f'done:{self.habit.id}', chat_id='999')  # чужой чат
+        self.assertFalse(HabitCompletion.objects.exists())
+
+        with self.assertNumQueries(8):  # не зависит от числа нажатий
+            counts = apply_telegram_updates()
+        self.assertEqual(counts, {'completed': 21, 'snoozed': 0, 'rejected': 1})
+        self.assertEqual(HabitStats.objects.filter(completions=1).count(), 21)
+
+
+class HabitConditionalGetTestCase(APITestCase):
+    url = '/api/habits/habits/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        self.habit = Habit.objects.create(user=self.user, action='Зарядка', place='Дом', time=time(8, 10),
+                                          duration=60, reward='Кофе')
+
+    def test_unchanged_list_is_not_modified_without_queries(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('updated_at', response.data['results'][0])
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get(f'{self.url}{self.habit.id}/')
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(f'{self.url}{self.habit.id}/',
+                                           HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_changes_invalidate_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.patch(f'{self.url}{self.habit.id}/', {'place': 'Парк', 'reward': 'Кофе'}, format='json')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+        etag = self.client.get(self.url)['ETag']
+        self.client.patch(f'{self.url}bulk/', [{'id': self.habit.id, 'place': 'Сад'}], format='json')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['place'], 'Сад')
+
+    def test_scheduler_writes_keep_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.habit.next_reminder_at = timezone.now()
+        self.habit.save(update_fields=['next_reminder_at'])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code,
+                         status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_is_per_user(self):
+        etag = self.client.get(self.url)['ETag']
+        other = get_user_model().objects.create_user(username='otheruser', password='testpass')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+
+THROTTLE_TEST_RATES = {**settings.REST_FRAMEWORK,
+                       'DEFAULT_THROTTLE_RATES': {'public_habits.ip': '3/min', 'public_habits.user': '5/min'}}
+
+
+@override_settings(REST_FRAMEWORK=THROTTLE_TEST_RATES)
+class PublicHabitThrottleTestCase(APITestCase):
+    url = '/api/habits/public-habits/'
+
+    def setUp(self):
+        cache.clear()
+        clear_local_blocks()
+        self.addCleanup(clear_local_blocks)
+
+    def test_anonymous_limited_per_ip(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        # Другой IP считается отдельно
+        self.assertEqual(self.client.get(self.url, REMOTE_ADDR='10.0.0.2').status_code, status.HTTP_200_OK)
+        # Отказ повторяется без обращения к счётчикам в кэше
+        with patch('config.throttling.CacheWindows.hit') as hit:
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        hit.assert_not_called()
+        self.assertEqual(self.client.get('/api/habits/async/public-habits/').status_code,
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_users_have_own_limit(self):
+        user = get_user_model().objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=user)
+        statuses = [self.client.get(self.url).status_code for _ in range(6)]
+        self.assertEqual(statuses, [200] * 5 + [429])
+
+    def test_previous_window_counts_with_decaying_weight(self):
+        with patch('config.throttling.time.time', return_value=590.0):  # конец предыдущего минутного окна
+            for _ in range(3):
+                self.client.get(self.url)
+        clear_local_blocks()
+        with patch('config.throttling.time.time', return_value=630.0):  # середина окна: 3 * 0.5 + текущие
+            statuses = [self.client.get(self.url).status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+
+
+class SchemaTestCase(APITestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.settings = override_settings(OPENAPI_SCHEMA_DIR=directory.name, OPENAPI_SCHEMA_AUTO_REFRESH=False)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        clear_loaded_schema()
+        self.addCleanup(clear_loaded_schema)
+
+    def test_generated_schema_is_served_with_etag(self):
+        call_command('generate_schema', stdout=io.StringIO())
+        with patch('config.schema.render_schema') as render:
+            response = self.client.get('/swagger.json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIn('/habits/habits/', json.loads(response.content)['paths'])  # basePath — /api
+            not_modified = self.client.get('/swagger.json', HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(self.client.get('/swagger.yaml').status_code, status.HTTP_200_OK)
+        render.assert_not_called()
+        self.assertEqual(self.client.get('/swagger/').status_code, status.HTTP_200_OK)
+
+    @override_settings(OPENAPI_SCHEMA_AUTO_REFRESH=True)
+    def test_dev_mode_regenerates_when_urlconf_changes(self):
+        with patch('config.schema.render_schema', wraps=render_schema) as render:
+            etag = self.client.get('/swagger.json')['ETag']
+            clear_loaded_schema()  # перезапуск процесса: схема читается с диска
+            self.assertEqual(self.client.get('/swagger.json')['ETag'], etag)
+            self.assertEqual(render.call_count, 1)
+            with patch('config.schema.urlconf_fingerprint', return_value='changed'):
+                self.client.get('/swagger.json')
+            self.assertEqual(render.call_count, 2)
+
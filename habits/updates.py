@@ -0,0 +1,96 @@
+# habits/updates.py
+import json
+import threading
+from collections import deque
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import redis
+from django.conf import settings
+
+from .models import Habit, HabitCompletion
+from .stats import local_today, record_completions
+from .telegram_bot import CALLBACK_DONE
+
+# Очередь нажатий inline-кнопок из вебхука Telegram. Вебхук только кладёт сюда
+# {"action", "habit", "chat", "at"}, а задача apply_telegram_updates разбирает очередь пачками.
+# С TELEGRAM_UPDATES_QUEUE_URL (по умолчанию CACHE_URL) — список Redis, общий для веб-процессов
+# и воркеров; без него — очередь процесса (разработка, тесты, eager Celery)
+
+UPDATES_QUEUE_KEY = 'telegram:updates'
+
+
+class MemoryQueue:
+    def __init__(self):
+        self.items = deque()
+        self.lock = threading.Lock()
+
+    def push(self, items):
+        with self.lock:
+            self.items.extend(items)
+
+    def pop(self, count):
+        with self.lock:
+            return [self.items.popleft() for _ in range(min(count, len(self.items)))]
+
+    def __len__(self):
+        return len(self.items)
+
+
+class RedisQueue:
+    def __init__(self, url, key=UPDATES_QUEUE_KEY):
+        self.client = redis.Redis.from_url(url)
+        self.key = key
+
+    def push(self, items):
+        if items:
+            self.client.rpush(self.key, *(json.dumps(item) for item in items))
+
+    def pop(self, count):
+        # LRANGE + LTRIM в MULTI: пачку забирает ровно один воркер
+        pipe = self.client.pipeline()
+        pipe.lrange(self.key, 0, count - 1)
+        pipe.ltrim(self.key, count, -1)
+        raw, _ = pipe.execute()
+        return [json.loads(item) for item in raw]
+
+    def __len__(self):
+        return self.client.llen(self.key)
+
+
+_queue = None
+
+
+def get_queue():
+    global _queue
+    if _queue is None:
+        url = settings.TELEGRAM_UPDATES_QUEUE_URL
+        _queue = RedisQueue(url) if url else MemoryQueue()
+    return _queue
+
+
+def apply_updates(items):
+    """
+    Применяет пачку нажатий: одна выборка привычек, выполнения через record_completions,
+    отложенные напоминания одним bulk_update. Нажатия из чужого чата отбрасываются.
+    """
+    habits = Habit.objects.select_related('user').in_bulk({item['habit'] for item in items})
+    done, snoozed, rejected = [], {}, 0
+    for item in items:
+        habit = habits.get(item['habit'])
+        if habit is None or str(habit.user.telegram_chat_id) != str(item['chat']):
+            rejected += 1
+            continue
+        pressed_at = datetime.fromtimestamp(item['at'], tz=dt_timezone.utc)
+        if item['action'] == CALLBACK_DONE:
+            done.append((habit, local_today(habit.user, pressed_at)))
+        else:
+            # Отложенное напоминание разовое: регулярный слот запоминаем, после отправки
+            # отложенного расписание вернётся к нему (повторное откладывание его не трогает)
+            if habit.regular_reminder_at is None:
+                habit.regular_reminder_at = habit.next_reminder_at
+            habit.next_reminder_at = pressed_at + timedelta(minutes=settings.TELEGRAM_SNOOZE_MINUTES)
+            snoozed[habit.id] = habit
+
+    completed = record_completions(done, HabitCompletion.SOURCE_TELEGRAM)
+    Habit.objects.bulk_update(list(snoozed.values()), ['next_reminder_at', 'regular_reminder_at'])
+    return {'completed': completed, 'snoozed': len(snoozed), 'rejected': rejected}
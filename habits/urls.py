@@ -1,5 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views, webhook
 from .views import HabitViewSet, PublicHabitViewSet
 
 router = DefaultRouter()
@@ -8,4 +9,10 @@ router.register(r'public-habits', PublicHabitViewSet, basename='public-habit')
 
 urlpatterns = [
     path('', include(router.urls)),
+    # Те же чтения на асинхронном ORM, для запуска под ASGI (config.asgi)
+    path('async/habits/', async_views.habit_list, name='async-habit-list'),
+    path('async/habits/<int:pk>/', async_views.habit_detail, name='async-habit-detail'),
+    path('async/public-habits/', async_views.public_habit_list, name='async-public-habit-list'),
+    path('async/public-habits/<int:pk>/', async_views.public_habit_detail, name='async-public-habit-detail'),
+    path('telegram/webhook/', webhook.telegram_webhook, name='telegram-webhook'),
 ]
@@ -1,10 +1,43 @@
 # habits/views.py
-from rest_framework import viewsets, permissions
+from contextlib import nullcontext
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework import status, viewsets, permissions
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
-from .models import Habit
+from config.replicas import use_primary
+from config.throttling import SlidingWindowThrottle
+from .bulk import bulk_create_habits, bulk_delete_habits, bulk_update_habits
+from .importer import detect_format, import_habits
+from .export import EXPORT_FORMATS, HABIT_EXPORT_COLUMNS, PUBLIC_EXPORT_COLUMNS, export_response
+from .cache import PUBLIC_HABITS_VERSION_KEY, changed_within, get_version, make_etag, user_habits_version_key
+from .models import Habit, Notification
+from .pagination import KeysetPaginationMixin
+from .search import HabitSearchFilter
 from .serializers import HabitSerializer, PublicHabitSerializer
+from .stats import get_stats, habit_stats_data, local_today, record_completion, user_stats_data
 from .permissions import IsOwnerOrReadOnly
-from .telegram_bot import send_reminder
+from .tasks import enqueue_outbox_drain
+from .telegram_bot import reminder_text
+
+
+def get_export_format(request):
+    # Не ?format=: этот параметр DRF использует для выбора рендерера
+    export_format = request.query_params.get('output', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return None
+    return export_format
+
+
+def invalid_export_format():
+    return Response({'detail': f"Формат выгрузки: {', '.join(EXPORT_FORMATS)}."},
+                    status=status.HTTP_400_BAD_REQUEST)
 
 
 class StandardResultsSetPagination(PageNumberPagination):
@@ -13,7 +46,7 @@ class StandardResultsSetPagination(PageNumberPagination):
     max_page_size = 100
 
 
-class HabitViewSet(viewsets.ModelViewSet):
+class HabitViewSet(KeysetPaginationMixin, viewsets.ModelViewSet):
     serializer_class = HabitSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
 
@@ -21,17 +54,160 @@ class HabitViewSet(viewsets.ModelViewSet):
         if getattr(self, 'swagger_fake_view', False):
             # Возвращаем пустой queryset для генерации схемы
             return Habit.objects.none()
-        return Habit.objects.select_related('user').filter(user=self.request.user)
+        queryset = Habit.objects.select_related('user').filter(user=self.request.user)
+        if self.action == 'habit_stats':
+            queryset = queryset.select_related('stats')
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_get(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_get(request, super().retrieve, *args, **kwargs)
+
+    def conditional_get(self, request, handler, *args, **kwargs):
+        # Версия привычек пользователя из кэша: пока она не менялась, клиент получает 304
+        # без запроса к базе и сериализации. Версия — время последнего изменения (микросекунды)
+        version = get_version(user_habits_version_key(request.user.id))
+        etag = make_etag(version, request.user.id, request.get_full_path(), request.accepted_renderer.format)
+        last_modified = version // 1_000_000
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
 
     def perform_create(self, serializer):
-        habit = serializer.save(user=self.request.user)
-        telegram_chat_id = habit.user.telegram_chat_id  # Получаем chat_id через пользователя
-        if telegram_chat_id:
-            send_reminder(telegram_chat_id, habit.action)
+        # Уведомление попадает в outbox в той же транзакции, что и привычка;
+        # в Telegram его отправляет воркер, запрос ждёт только базу
+        with transaction.atomic():
+            habit = serializer.save(user=self.request.user)
+            telegram_chat_id = habit.user.telegram_chat_id  # Получаем chat_id через пользователя
+            if telegram_chat_id:
+                Notification.objects.create(habit=habit, chat_id=telegram_chat_id, text=reminder_text(habit.action))
+                transaction.on_commit(enqueue_outbox_drain)
+
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None):
+        # Отметка выполнения за сегодня (по часовому поясу пользователя) или за {"date": "ГГГГ-ММ-ДД"}
+        habit = self.get_object()
+        today = local_today(request.user)
+        day = today
+        if request.data.get('date'):
+            try:
+                day = date.fromisoformat(str(request.data['date']))
+            except ValueError:
+                return Response({'date': ['Ожидается дата ГГГГ-ММ-ДД.']}, status=status.HTTP_400_BAD_REQUEST)
+            if day > today:
+                return Response({'date': ['Дата в будущем.']}, status=status.HTTP_400_BAD_REQUEST)
+        stats, created = record_completion(habit, day)
+        return Response(habit_stats_data(habit, stats, today),
+                        status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'], url_path='stats')
+    def habit_stats(self, request, pk=None):
+        habit = self.get_object()
+        return Response(habit_stats_data(habit, get_stats(habit), local_today(request.user)))
 
+    @action(detail=False, methods=['get'], url_path='stats')
+    def stats(self, request):
+        # Сводка по всем привычкам: одна строка HabitStats на привычку, без истории выполнений
+        habits = Habit.objects.filter(user=request.user).select_related('stats')
+        return Response(user_stats_data(habits, local_today(request.user)))
 
-class PublicHabitViewSet(viewsets.ReadOnlyModelViewSet):
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request):
+        # Все привычки пользователя потоком: ?output=ndjson (по умолчанию) или ?output=csv
+        export_format = get_export_format(request)
+        if export_format is None:
+            return invalid_export_format()
+        return export_response(Habit.objects.filter(user=request.user), HABIT_EXPORT_COLUMNS, export_format, 'habits')
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_file(self, request):
+        # multipart-поле file; формат по расширению или ?input=csv|ndjson.
+        # Строки с ошибками пропускаются, остальные сохраняются пачками
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'detail': 'Нужен файл в поле file.'}, status=status.HTTP_400_BAD_REQUEST)
+        import_format = detect_format(upload.name, request.query_params.get('input'))
+        if import_format is None:
+            return Response({'detail': f"Формат импорта: {', '.join(EXPORT_FORMATS)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        result = import_habits(request.user, upload.file, import_format)
+        response_status = status.HTTP_201_CREATED if result.created else status.HTTP_200_OK
+        return Response(result.as_dict(), status=response_status)
+
+    @action(detail=False, methods=['post', 'patch', 'delete'], url_path='bulk')
+    def bulk(self, request):
+        # POST — список новых привычек, PATCH — список изменений с id, DELETE — список id.
+        # Пачка сохраняется целиком или не сохраняется вовсе
+        items = request.data
+        if not isinstance(items, list):
+            return Response({'detail': 'Ожидается список.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.HABITS_BULK_MAX_ITEMS:
+            return Response({'detail': f'Не больше {settings.HABITS_BULK_MAX_ITEMS} элементов за запрос.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if request.method == 'DELETE':
+            ids = [item.get('id') if isinstance(item, dict) else item for item in items]
+            deleted, errors = bulk_delete_habits(request.user, ids)
+            if errors:
+                return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({'deleted': deleted})
+
+        if not all(isinstance(item, dict) for item in items):
+            return Response({'detail': 'Элементы списка должны быть объектами.'}, status=status.HTTP_400_BAD_REQUEST)
+        if request.method == 'POST':
+            habits, errors = bulk_create_habits(request.user, items)
+        else:
+            habits, errors = bulk_update_habits(request.user, items)
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        response_status = status.HTTP_201_CREATED if request.method == 'POST' else status.HTTP_200_OK
+        return Response({'results': HabitSerializer(habits, many=True).data}, status=response_status)
+
+
+class PublicHabitViewSet(KeysetPaginationMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = PublicHabitSerializer
     queryset = Habit.objects.filter(is_public=True)
     permission_classes = [permissions.AllowAny]
     pagination_class = StandardResultsSetPagination
+    filter_backends = [HabitSearchFilter]
+    throttle_classes = [SlidingWindowThrottle]
+    throttle_scope = 'public_habits'
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request):
+        export_format = get_export_format(request)
+        if export_format is None:
+            return invalid_export_format()
+        return export_response(self.filter_queryset(self.get_queryset()), PUBLIC_EXPORT_COLUMNS, export_format,
+                               'public-habits')
+
+    def list(self, request, *args, **kwargs):
+        # Страницы одинаковы для всех, поэтому кэшируем готовые данные страницы;
+        # версия сбрасывается сигналами при изменении публичных привычек
+        version = get_version(PUBLIC_HABITS_VERSION_KEY)
+        params = request.query_params
+        etag = make_etag(version, request.get_host(), request.path, params.get('page', '1'),
+                         params.get('page_size', ''), params.get('cursor'), params.get('search', ''))
+
+        if etag in request.headers.get('If-None-Match', ''):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            key = f'habits:public:list:{etag}'
+            data = cache.get(key)
+            if data is None:
+                # Страница новой версии не должна попасть в кэш с отстающей реплики
+                with use_primary() if changed_within(version, settings.REPLICA_PIN_SECONDS) else nullcontext():
+                    data = super().list(request, *args, **kwargs).data
+                cache.set(key, data, settings.PUBLIC_HABITS_CACHE_TIMEOUT)
+            response = Response(data)
+
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=settings.PUBLIC_HABITS_MAX_AGE)
+        return response
@@ -0,0 +1,51 @@
+# habits/webhook.py
+import hmac
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from .tasks import UPDATES_SCHEDULED_KEY, enqueue_updates_apply
+from .telegram_bot import CALLBACK_DONE, parse_callback_data
+from .updates import get_queue
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+@csrf_exempt
+@require_POST
+def telegram_webhook(request):
+    """
+    Приём обновлений Telegram (setWebhook с secret_token = TELEGRAM_WEBHOOK_SECRET).
+    Без базы: нажатие кнопки уходит в очередь, ответ на callback — прямо в ответе вебхука.
+    """
+    secret = settings.TELEGRAM_WEBHOOK_SECRET
+    if not secret:
+        raise Http404
+    if not hmac.compare_digest(request.headers.get(SECRET_HEADER, '').encode(), secret.encode()):
+        return HttpResponseForbidden()
+    try:
+        update = json.loads(request.body)
+    except ValueError:
+        return HttpResponseBadRequest()
+
+    callback = update.get('callback_query') if isinstance(update, dict) else None
+    parsed = parse_callback_data(callback.get('data')) if isinstance(callback, dict) else None
+    if parsed is None:
+        # Остальные обновления не нужны; 200, чтобы Telegram не присылал их повторно
+        return HttpResponse()
+
+    action, habit_id = parsed
+    chat = (callback.get('message') or {}).get('chat') or callback.get('from') or {}
+    get_queue().push([{'action': action, 'habit': habit_id, 'chat': str(chat.get('id')), 'at': time.time()}])
+    # Одна задача на всплеск нажатий: следующая ставится, только когда предыдущая начала разбор
+    if cache.add(UPDATES_SCHEDULED_KEY, 1, settings.TELEGRAM_UPDATES_SCHEDULE_TIMEOUT):
+        enqueue_updates_apply()
+
+    text = 'Отмечено ✅' if action == CALLBACK_DONE else f'Напомню через {settings.TELEGRAM_SNOOZE_MINUTES} мин'
+    return JsonResponse({'method': 'answerCallbackQuery', 'callback_query_id': callback.get('id'), 'text': text},
+                        json_dumps_params={'ensure_ascii': False})
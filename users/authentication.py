@@ -0,0 +1,94 @@
+# users/authentication.py
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+# Пользователь из JWT кэшируется в два слоя: на AUTH_USER_LOCAL_TTL в памяти процесса
+# и в общем кэше, где запись действительна, пока не изменилась версия пользователя
+
+_local_users = {}  # user_id -> (истекает, пользователь)
+LOCAL_MAX_USERS = 10_000
+_local_lock = threading.Lock()
+
+
+def user_cache_key(user_id):
+    return f'users:auth:{user_id}'
+
+
+def user_version_key(user_id):
+    return f'users:auth:{user_id}:version'
+
+
+def invalidate_user(user_id):
+    """Вызывается при сохранении и удалении пользователя: запись в общем кэше перестаёт совпадать по версии."""
+    cache.set(user_version_key(user_id), time.time_ns(), None)
+    with _local_lock:
+        _local_users.pop(str(user_id), None)
+
+
+def clear_local_users():
+    with _local_lock:
+        _local_users.clear()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication без запроса к users_customuser на каждый вызов API.
+    Проверки is_active и CHECK_REVOKE_TOKEN выполняются над закэшированным пользователем.
+    Изменения через QuerySet.update() сигналов не шлют — после них нужен invalidate_user.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        user = self.get_cached_user(user_id)
+
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+        return user
+
+    def get_cached_user(self, user_id):
+        key = str(user_id)
+        now = time.monotonic()
+        entry = _local_users.get(key)
+        if entry is not None and entry[0] > now:
+            # Копия: запрос может менять атрибуты пользователя, не затрагивая соседние потоки
+            return copy.copy(entry[1])
+
+        # Запись и версия — одним обращением к кэшу
+        data_key, version_key = user_cache_key(key), user_version_key(key)
+        stored = cache.get_many([data_key, version_key])
+        version = stored.get(version_key)
+        cached = stored.get(data_key)
+        if cached is not None and cached[0] == version:
+            user = cached[1]
+        else:
+            try:
+                user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            # Версия прочитана до запроса к базе: если пользователь изменился в промежутке,
+            # запись не совпадёт с новой версией и будет перечитана
+            cache.set(data_key, (version, user), settings.AUTH_USER_CACHE_TIMEOUT)
+
+        with _local_lock:
+            if len(_local_users) >= LOCAL_MAX_USERS:
+                _local_users.clear()
+            _local_users[key] = (now + settings.AUTH_USER_LOCAL_TTL, user)
+        return copy.copy(user)
@@ -3,3 +3,19 @@ from django.db import models
 
 class CustomUser(AbstractUser):
     telegram_chat_id = models.CharField(max_length=50, blank=True, null=True)
+    timezone = models.CharField(max_length=63, default='UTC')  # IANA, например Europe/Moscow
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def timezone_changed(self):
+        loaded = getattr(self, '_loaded_values', None)
+        return loaded is not None and 'timezone' in loaded and loaded['timezone'] != self.timezone
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Сохранённые значения становятся «загруженными» для следующего save (сигналы видят прежние)
+        self._loaded_values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
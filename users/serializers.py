@@ -1,7 +1,12 @@
-from django.contrib.auth.models import User
+from django.contrib.auth import get_user_model
 from rest_framework import serializers
 
-class UserSerializer(serializers.ModelSerializer):
+from config.performance import TimedSerializerMixin
+
+User = get_user_model()
+
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['username', 'password', 'email']  # Добавьте необходимые поля
@@ -1,3 +1,79 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from config.throttling import clear_local_blocks
+from .authentication import clear_local_users, user_version_key
+
+
+class CachedJWTAuthenticationTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        clear_local_users()
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def get(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get('/api/habits/habits/')
+        return response, len(captured)
+
+    def test_user_lookup_is_cached(self):
+        response, cold = self.get()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Второй процесс: памяти процесса нет, пользователь берётся из общего кэша
+        clear_local_users()
+        response, warm = self.get()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(warm, cold - 1)
+
+    def test_deactivation_invalidates_cache(self):
+        self.get()
+        self.user.is_active = False
+        self.user.save()
+        response, _ = self.get()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_change_in_another_process_is_seen_via_version(self):
+        self.get()
+        get_user_model().objects.filter(pk=self.user.pk).update(is_active=False)
+        # Сигнал из другого процесса: общий кэш устарел, память этого процесса — нет
+        cache.set(user_version_key(self.user.pk), 1, None)
+        clear_local_users()
+        response, _ = self.get()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'register.ip': '2/hour'}})
+class RegisterThrottleTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        clear_local_blocks()
+        self.addCleanup(clear_local_blocks)
+
+    def register(self, number, **extra):
+        return self.client.post('/api/users/register/', {
+            'username': f'newuser{number}', 'password': 'S3cure-pass!', 'email': 'new@example.com',
+        }, format='json', **extra)
+
+    def test_signups_limited_per_ip(self):
+        self.assertEqual(self.register(1).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.register(2).status_code, status.HTTP_201_CREATED)
+        # Третья регистрация отклоняется до валидации и хеширования пароля
+        with CaptureQueriesContext(connection) as captured:
+            response = self.register(3)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(len(captured), 0)
+        self.assertFalse(get_user_model().objects.filter(username='newuser3').exists())
+
+    def test_spoofed_forwarded_for_shares_bucket(self):
+        statuses = [self.register(number, HTTP_X_FORWARDED_FOR=f'203.0.113.{number}').status_code
+                    for number in range(5)]
+        self.assertEqual(statuses, [201, 201, 429, 429, 429])
 
-# Create your tests here.
@@ -1,10 +1,14 @@
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.contrib.auth.models import User
+from config.throttling import SlidingWindowThrottle
 from .serializers import UserSerializer
 
 class RegisterView(APIView):
+    # Ограничение по IP проверяется до валидации и хеширования пароля
+    throttle_classes = [SlidingWindowThrottle]
+    throttle_scope = 'register'
+
     def post(self, request):
         serializer = UserSerializer(data=request.data)
         if serializer.is_valid():